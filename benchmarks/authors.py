@@ -0,0 +1,67 @@
+"""
+Benchmark the author list at scale: every sort, prefix and status combination.
+
+    python -m benchmarks.authors --authors 1000000
+
+Each combination is timed reading its first page and a page 100 pages in,
+the way AuthorListView does, after the matching count is cached.
+"""
+import argparse
+import random
+import string
+
+from benchmarks import harness
+
+def seed(count):
+    import datetime
+    from catalog.models import Author
+
+    rng = random.Random(0)
+    syllables = ['an', 'ber', 'cal', 'dor', 'el', 'fin', 'gar', 'hol', 'is', 'jun', 'kel', 'lor', 'mar', 'nor', 'os', 'per', 'quin', 'ros', 'sel', 'tor']
+
+    def author(i):
+        born = datetime.date(1800, 1, 1) + datetime.timedelta(days=rng.randrange(200 * 365)) if rng.random() < 0.9 else None
+        died = born + datetime.timedelta(days=rng.randrange(20 * 365, 90 * 365)) if born and rng.random() < 0.6 else None
+        last_name = rng.choice(string.ascii_uppercase) + ''.join(rng.choice(syllables) for _ in range(rng.randint(1, 3)))
+        return Author(first_name=f'First {i}', last_name=last_name, date_of_birth=born, date_of_death=died,
+                      book_count=int(rng.paretovariate(1.5)) - 1, copy_count=int(rng.paretovariate(1.2)) - 1)
+
+    for batch in harness.batched((author(i) for i in range(count)), 10000):
+        Author.objects.bulk_create(batch)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--authors', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--explain', action='store_true', help='print the query plan of each combination')
+    args = parser.parse_args()
+
+    harness.setup()
+    from django.db import connection
+    from django.http import QueryDict
+    from catalog import authors
+    from catalog.models import Author
+
+    with harness.test_database():
+        seed(args.authors)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        for sort, label, ordering in authors.SORTS:
+            for prefix in ('', 'M', 'Mar'):
+                for status in ('', authors.LIVING, authors.DECEASED):
+                    options = authors.parse_options(QueryDict(f'sort={sort}&prefix={prefix}&status={status}'))
+                    matching = authors.count_authors(options)
+                    queryset = authors.filter_authors(Author.objects.all(), options)
+                    name = f'sort={sort} prefix={prefix or "-"} status={status or "-"}'
+                    harness.timeit(f'{name} page 1', lambda: list(queryset[:args.page_size]), args.repeat)
+                    offset = min(100 * args.page_size, matching - matching % args.page_size)
+                    if offset:
+                        harness.timeit(f'{name} page {offset // args.page_size + 1}',
+                                       lambda: list(queryset[offset:offset + args.page_size]), args.repeat)
+                    if args.explain:
+                        print('   ', queryset[:args.page_size].explain().replace('\n', '\n    '))
+
+if __name__ == '__main__':
+    main()
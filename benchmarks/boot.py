@@ -0,0 +1,108 @@
+"""
+Benchmark time to first fast response of a freshly started gunicorn.
+
+    python -m benchmarks.boot --runs 3 --fast-ms 20
+
+gunicorn is started against a throwaway, migrated SQLite database, once
+cold (WSGI_WARMUP=False, no --preload: everything is built by the first
+requests) and once warm (preloaded and warmed in the master, as in the
+Procfile). For each it reports, in ms from starting gunicorn:
+
+    accepting   the worker accepts connections
+    first       the first page comes back
+    all fast    every page has come back within --fast-ms
+
+and the latency of the first request for each page.
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+PAGES = ('/catalog/', '/catalog/branches/', '/accounts/login/')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        raise SystemExit(f'{url} returned {e.code}')
+    return time.perf_counter() - start
+
+def boot(env, warm, fast_ms, timeout=60):
+    port = free_port()
+    command = [shutil.which('gunicorn'), 'locallibrary.wsgi', '--bind', f'127.0.0.1:{port}', '--workers', '1']
+    env = dict(env, WSGI_WARMUP='True' if warm else 'False')
+    if warm:
+        command.append('--preload')
+
+    start = time.perf_counter()
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.perf_counter() - start > timeout:
+                    raise SystemExit('gunicorn did not start')
+                time.sleep(0.005)
+        accepting = time.perf_counter() - start
+
+        first_latency = {}
+        first = None
+        while True:
+            latencies = {page: fetch(f'http://127.0.0.1:{port}{page}') for page in PAGES}
+            for page, latency in latencies.items():
+                first_latency.setdefault(page, latency)
+            first = first or time.perf_counter() - start
+            if max(latencies.values()) * 1000 <= fast_ms:
+                return accepting, first, time.perf_counter() - start, first_latency
+            if time.perf_counter() - start > timeout:
+                raise SystemExit(f'no round of requests within {fast_ms} ms; raise --fast-ms')
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--fast-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        env = dict(
+            os.environ,
+            DJANGO_DEBUG='False',
+            DATABASE_URL=f'sqlite:///{os.path.join(directory, "db.sqlite3")}',
+            SHARED_CACHE_LOCATION=os.path.join(directory, 'cache'),
+        )
+        env.pop('PROFILING_DIR', None)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], env=env, check=True)
+
+        for warm in (False, True):
+            runs = [boot(env, warm, args.fast_ms) for _ in range(args.runs)]
+            print(f"{'warm (preload)' if warm else 'cold'}, median of {args.runs} runs")
+            for index, label in enumerate(('accepting', 'first', 'all fast')):
+                print(f'  {label:<30} {statistics.median(run[index] for run in runs) * 1000:9.1f} ms')
+            for page in PAGES:
+                print(f'  first {page:<24} {statistics.median(run[3][page] for run in runs) * 1000:9.1f} ms')
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
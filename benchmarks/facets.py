@@ -0,0 +1,68 @@
+"""
+Benchmark the faceted book list: facet counts and filtered pages at catalog scale.
+
+    python -m benchmarks.facets --books 1000000
+"""
+import argparse
+import random
+
+from benchmarks import harness
+
+def seed(books, authors, genres, languages):
+    from catalog.models import Author, Book, Genre, Language
+
+    Genre.objects.bulk_create(Genre(name=f'Genre {i}') for i in range(genres))
+    Language.objects.bulk_create(Language(name=f'Language {i}') for i in range(languages))
+    for batch in harness.batched((Author(first_name=f'First {i}', last_name=f'Last {i}') for i in range(authors)), 10000):
+        Author.objects.bulk_create(batch)
+
+    genre_ids = list(Genre.objects.values_list('pk', flat=True))
+    language_ids = list(Language.objects.values_list('pk', flat=True))
+    author_ids = list(Author.objects.values_list('pk', flat=True))
+    rng = random.Random(0)
+    for batch in harness.batched(range(books), 10000):
+        Book.objects.bulk_create(
+            Book(title=f'Book {i}', summary='', isbn=f'{i}', author_id=rng.choice(author_ids), language_id=rng.choice(language_ids))
+            for i in batch
+        )
+    book_ids = Book.objects.values_list('pk', flat=True).iterator()
+    tags = (Book.genre.through(book_id=book_id, genre_id=genre_id)
+            for book_id in book_ids for genre_id in rng.sample(genre_ids, rng.randint(1, 3)))
+    for batch in harness.batched(tags, 10000):
+        Book.genre.through.objects.bulk_create(batch)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--authors', type=int, default=50000)
+    parser.add_argument('--genres', type=int, default=40)
+    parser.add_argument('--languages', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    harness.setup()
+    from django.core.cache import cache
+    from catalog import facets
+    from catalog.models import Book, Genre, Language
+
+    with harness.test_database():
+        print(f'seeding {args.books} books ...')
+        seed(args.books, args.authors, args.genres, args.languages)
+        genre_id = Genre.objects.values_list('pk', flat=True).first()
+        language_id = Language.objects.values_list('pk', flat=True).first()
+
+        selections = {
+            'no filters': {},
+            'one genre': {'genre': [genre_id]},
+            'genre + language': {'genre': [genre_id], 'language': [language_id]},
+        }
+        for label, selected in selections.items():
+            filters = {'genre': [], 'language': [], 'author': [], **selected}
+            harness.timeit(f'facet counts, {label}', lambda: facets.facet_counts(filters), args.repeat)
+            harness.timeit(f'first page, {label}', lambda: list(facets.filter_books(Book.objects.order_by('pk'), filters)[:10]), args.repeat)
+            cache.clear()
+            facets.cached_facet_counts(filters)
+            harness.timeit(f'cached facet counts, {label}', lambda: facets.cached_facet_counts(filters), args.repeat)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Shared helpers for the benchmark scripts in this package.
+
+Each benchmark is run from the project root, e.g.::
+
+    python -m benchmarks.facets --books 1000000
+
+and works against a throwaway test database created from the configured
+DATABASES (set DATABASE_URL to benchmark against PostgreSQL).
+"""
+import contextlib
+import os
+import statistics
+import time
+
+import django
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    django.setup()
+
+@contextlib.contextmanager
+def test_database():
+    """Create an empty, migrated test database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def timeit(label, func, repeat=5):
+    """Run func repeat times and print the best and median wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f'{label:<50} best {min(timings):9.2f} ms   median {statistics.median(timings):9.2f} ms')
+    return timings
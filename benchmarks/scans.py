@@ -0,0 +1,60 @@
+"""
+Benchmark batch check-in/check-out throughput in scans per second.
+
+    python -m benchmarks.scans --copies 100000 --batch 200
+
+Carts of scans alternate between check-out and check-in so every scan
+changes a copy. Throughput is measured both through the full HTTP stack
+(test client, middleware, auth) and by calling catalog.circulation directly.
+"""
+import argparse
+import json
+import time
+
+from benchmarks import harness
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--copies', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--batches', type=int, default=50)
+    args = parser.parse_args()
+
+    harness.setup()
+    from django.contrib.auth.models import Permission, User
+    from django.test import Client
+    from django.urls import reverse
+    from catalog import circulation
+    from catalog.models import Book, BookInstance
+
+    with harness.test_database():
+        librarian = User.objects.create_user(username='librarian', password='p@55w0rd')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        book = Book.objects.create(title='Benchmark', summary='', isbn='9780306406157')
+        for batch in harness.batched(range(args.copies), 10000):
+            BookInstance.objects.bulk_create(BookInstance(book=book, imprint='Benchmark', status='a') for _ in batch)
+        copy_ids = [str(pk) for pk in BookInstance.objects.values_list('pk', flat=True)]
+        carts = list(harness.batched(copy_ids, args.batch))[:args.batches]
+
+        client = Client()
+        client.login(username='librarian', password='p@55w0rd')
+
+        def over_http(cart, action):
+            client.post(reverse('scan-copies'), json.dumps({'action': action, 'copies': cart, 'borrower': 'reader'}), content_type='application/json')
+
+        def direct(cart, action):
+            circulation.scan(action, cart, borrower=reader)
+
+        for label, send in (('HTTP endpoint', over_http), ('circulation.scan()', direct)):
+            scans = 0
+            start = time.perf_counter()
+            for cart in carts:
+                send(cart, circulation.CHECK_OUT)
+                send(cart, circulation.CHECK_IN)
+                scans += 2 * len(cart)
+            elapsed = time.perf_counter() - start
+            print(f'{label:<22} {scans} scans in {elapsed:.2f}s = {scans / elapsed:,.0f} scans/s (carts of {args.batch})')
+
+if __name__ == '__main__':
+    main()
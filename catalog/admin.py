@@ -42,15 +42,29 @@ class BookAdmin(admin.ModelAdmin):
 # Register the Admin classes for BookInstance using the decorator
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
-    list_display = ('book', 'status', 'borrower', 'due_back', 'id')
+    list_display = ('book', 'status', 'borrower', 'due_back', 'branch', 'id')
     # provides panel w filtering options
-    list_filter = ('status', 'due_back')
+    list_filter = ('status', 'due_back', 'branch')
     # breaks up form into sections (in this case, one with no label (None) and one titled 'Availablity')
     fieldsets = (
         (None, {
-            'fields': ('book', 'imprint', 'id')
+            'fields': ('book', 'imprint', 'branch', 'id')
         }),
         ('Availability', {
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+
+from catalog.models import Task
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'duration', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created', 'finished', 'duration', 'locked_by', 'locked_at', 'last_error')
+
+from catalog.models import Branch
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ('name', 'address')
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CatalogConfig(AppConfig):
     name = 'catalog'
+
+    def ready(self):
+        # connect the signal handlers that maintain denormalized data
+        from catalog import signals  # noqa: F401
@@ -0,0 +1,116 @@
+"""
+Sorting and filtering the author list, and the per-author counts behind it.
+
+Author.book_count and Author.copy_count are denormalized so the list never
+groups Book or BookInstance rows. The signal handlers in catalog.signals
+adjust them on every book and copy save or delete; rebuild_counts() recounts
+them after bulk edits that bypass those handlers.
+
+Each sort has an index in its exact order, and a second one led by
+Author.initial for when the list is narrowed to a name prefix, so every page
+is read in index order and stops after paginate_by rows; the number of
+matching authors, which the paginator needs, is cached. Longer prefixes also
+narrow Author.name_key, the upper-cased last name, to a range, which is
+selective enough that the database may prefer its index and sort the few
+matches; prefixes are matched in either case throughout. The living/deceased
+filter is checked against the rows as they are read in index order. Sorting by date of
+birth lists only the authors whose birth date is known, which also keeps
+NULLs, ordered first by some databases and last by others, out of the scan.
+"""
+import hashlib
+import sys
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.http import urlencode
+
+from catalog.caching import LOOKUP_CACHE_TIMEOUT, cached
+from catalog.models import Author, Book, BookInstance
+
+# (query value, label, ordering) for each way the author list can be sorted
+SORTS = (
+    ('name', 'Name', ('last_name', 'first_name', 'id')),
+    ('books', 'Most books', ('-book_count', 'last_name', 'first_name', 'id')),
+    ('copies', 'Most copies', ('-copy_count', 'last_name', 'first_name', 'id')),
+    # a filter as much as a sort, see filter_authors(), so the label says so
+    ('born', 'Date of birth (known only)', ('date_of_birth', 'last_name', 'first_name', 'id')),
+)
+DEFAULT_SORT = 'name'
+
+LIVING = 'living'
+DECEASED = 'deceased'
+STATUSES = ((LIVING, 'Living'), (DECEASED, 'Deceased'))
+
+PREFIX_MAX_LENGTH = 100
+
+def parse_options(query_dict):
+    """Read the sort, name prefix and status out of the request's query parameters, ignoring unknown values."""
+    sort = query_dict.get('sort', DEFAULT_SORT)
+    status = query_dict.get('status', '')
+    prefix = query_dict.get('prefix', '').strip()[:PREFIX_MAX_LENGTH]
+    return {
+        'sort': sort if sort in {value for value, label, ordering in SORTS} else DEFAULT_SORT,
+        # matched in either case, through Author.initial and Author.name_key; the first letter is shown upper-cased
+        'prefix': prefix[:1].upper() + prefix[1:],
+        'status': status if status in {value for value, label in STATUSES} else '',
+    }
+
+def querystring(options):
+    """Query string for the options that differ from the defaults, used to keep them across pages."""
+    return urlencode([(name, value) for name, value in sorted(options.items())
+                      if value and not (name == 'sort' and value == DEFAULT_SORT)])
+
+def _prefix_upper_bound(prefix):
+    """The smallest string above every string that starts with prefix, or None if there is none."""
+    # the last character can't be moved on past the largest code point, so the one before it is
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return None
+    following = ord(stem[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # surrogates can't be encoded, and nothing in a last name sorts between them and U+E000
+        following = 0xE000
+    return stem[:-1] + chr(following)
+
+def filter_authors(authors, options):
+    """Authors matching the options, in the chosen order."""
+    prefix = options['prefix']
+    if prefix:
+        authors = authors.filter(initial=Author._meta.get_field('initial').upper_case(prefix))
+        if len(prefix) > 1:
+            key = Author._meta.get_field('name_key').upper_case(prefix)
+            # a range rather than startswith, which can't use an index on SQLite or with most PostgreSQL collations
+            authors = authors.filter(name_key__gte=key)
+            upper = _prefix_upper_bound(key)
+            if upper is not None:
+                authors = authors.filter(name_key__lt=upper)
+    if options['status'] == LIVING:
+        authors = authors.filter(date_of_death__isnull=True)
+    elif options['status'] == DECEASED:
+        authors = authors.filter(date_of_death__isnull=False)
+    if options['sort'] == 'born':
+        authors = authors.filter(date_of_birth__isnull=False)
+    ordering = next(ordering for value, label, ordering in SORTS if value == options['sort'])
+    return authors.order_by(*ordering)
+
+def count_authors(options):
+    """How many authors match the options, cached until an author or book is saved or deleted."""
+    key = hashlib.md5(f"{options['sort']}:{options['prefix'].upper()}:{options['status']}".encode()).hexdigest()
+    return cached(f'authors:{key}', lambda: filter_authors(Author.objects.all(), options).order_by().count(), LOOKUP_CACHE_TIMEOUT)
+
+def adjust_counts(author_id, books=0, copies=0):
+    """Add books and copies to an author's counts."""
+    if author_id is not None and (books or copies):
+        Author.objects.filter(pk=author_id).update(book_count=F('book_count') + books, copy_count=F('copy_count') + copies)
+
+def adjust_copy_count(book_id, copies):
+    """Add copies to the count of the author of a book, in one query."""
+    if book_id is not None and copies:
+        Author.objects.filter(book__pk=book_id).update(copy_count=F('copy_count') + copies)
+
+def rebuild_counts():
+    """Recount every author's books and copies, for after imports, merges or raw SQL edits."""
+    books = Book.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(n=Count('pk')).values('n')
+    copies = (BookInstance.objects.filter(book__author=OuterRef('pk')).order_by()
+              .values('book__author').annotate(n=Count('pk')).values('n'))
+    return Author.objects.update(book_count=Coalesce(Subquery(books), 0), copy_count=Coalesce(Subquery(copies), 0))
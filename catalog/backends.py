@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from catalog.caching import bump_version, version
+
+# Each user's permission set is cached under the user's pk and a version that
+# catalog.signals bumps when a group's or permission's assignments change;
+# changes to one user's groups or permissions just delete that user's entry.
+PERMISSIONS_VERSION_KEY = 'auth:perms:version'
+PERMISSIONS_CACHE_TIMEOUT = getattr(settings, 'PERMISSIONS_CACHE_TIMEOUT', 60 * 60)
+
+def permissions_cache():
+    return caches[getattr(settings, 'PERMISSIONS_CACHE', 'default')]
+
+def permissions_key(user_id):
+    return f'auth:perms:{version(PERMISSIONS_VERSION_KEY, permissions_cache())}:{user_id}'
+
+def forget_permissions(user_id):
+    permissions_cache().delete(permissions_key(user_id))
+
+def forget_all_permissions():
+    bump_version(PERMISSIONS_VERSION_KEY, permissions_cache())
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps each user's permission set in the cache, so
+    permission_required, PermissionRequiredMixin and {{ perms }} checks don't
+    query the user and group permission tables on every request.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = permissions_key(user_obj.pk)
+            perms = permissions_cache().get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                permissions_cache().set(key, perms, PERMISSIONS_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
@@ -0,0 +1,127 @@
+"""
+Branches and their inventory counts.
+
+BranchStock holds how many copies of each book a branch has, and how many of
+those are available, so branch pages never count BookInstance rows. The
+signal handlers in catalog.signals keep it in step with copy saves and
+deletes; bulk updates (catalog.circulation, transfer() below) bypass those
+and apply their changes with apply_stock_changes() in the same transaction.
+"""
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from catalog import changelog
+from catalog.models import BookInstance, BranchStock
+
+# fits in a single IN clause even on SQLite
+MAX_TRANSFER = 500
+
+# outcomes of a transfer
+MOVED = 'moved'
+ON_LOAN = 'on_loan'
+ALREADY_THERE = 'already_there'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+NOT_FOUND = 'not_found'
+
+def stock_key(branch_id, book_id, status):
+    """What a copy counts towards: ((branch_id, book_id), available), or None if it counts towards nothing."""
+    if branch_id is None or book_id is None:
+        return None
+    return (branch_id, book_id), int(status == 'a')
+
+def stock_changes():
+    """{(branch_id, book_id): [copies, available]} changes, filled in by add_stock_change()."""
+    return defaultdict(lambda: [0, 0])
+
+def add_stock_change(changes, before, after):
+    """Record a copy going from counting towards before to counting towards after, both stock_key() values."""
+    if before != after:
+        if before is not None:
+            changes[before[0]][0] -= 1
+            changes[before[0]][1] -= before[1]
+        if after is not None:
+            changes[after[0]][0] += 1
+            changes[after[0]][1] += after[1]
+
+def apply_stock_changes(changes):
+    """Apply the output of stock_changes() with one F() update per (branch, book)."""
+    # always in the same order, so concurrent transactions lock the rows in the same order
+    for (branch_id, book_id), (copies, available) in sorted(changes.items()):
+        if not copies and not available:
+            continue
+        stock = BranchStock.objects.filter(branch_id=branch_id, book_id=book_id)
+        if not stock.update(copies=F('copies') + copies, available=F('available') + available):
+            # first copy of this book at the branch
+            BranchStock.objects.get_or_create(branch_id=branch_id, book_id=book_id)
+            stock.update(copies=F('copies') + copies, available=F('available') + available)
+
+def transfer(scanned, branch):
+    """
+    Move every scanned copy that isn't on loan to branch.
+
+    Returns one {'scanned', 'outcome', 'from_branch'} dict per scanned value, in order.
+    """
+    ids = {}
+    for value in scanned:
+        try:
+            ids[value] = uuid.UUID(str(value))
+        except ValueError:
+            ids[value] = None
+
+    with transaction.atomic():
+        copies = (BookInstance.objects
+                  .select_for_update()
+                  .filter(pk__in={pk for pk in ids.values() if pk})
+                  .only('id', 'status', 'book', 'branch'))
+        copies = {copy.pk: copy for copy in copies}
+
+        results = []
+        moved = {}
+        seen = set()
+        for value in scanned:
+            pk = ids[value]
+            copy = copies.get(pk)
+            if pk is None:
+                outcome = INVALID
+            elif copy is None:
+                outcome = NOT_FOUND
+            elif pk in seen:
+                outcome = DUPLICATE
+            elif copy.branch_id == branch.pk:
+                outcome = ALREADY_THERE
+            elif copy.status == 'o':
+                outcome = ON_LOAN
+            else:
+                outcome = MOVED
+                moved[pk] = copy
+            seen.add(pk)
+            results.append({'scanned': value, 'outcome': outcome, 'from_branch': copy.branch_id if copy is not None else None})
+
+        if moved:
+            # a queryset update skips the post_save handlers, so the stock and change log are written here
+            BookInstance.objects.filter(pk__in=list(moved)).update(branch=branch, version=F('version') + 1)
+            changelog.record_updates(BookInstance, list(moved), {'branch_id': branch.pk})
+            changes = stock_changes()
+            for copy in moved.values():
+                add_stock_change(changes, stock_key(copy.branch_id, copy.book_id, copy.status), stock_key(branch.pk, copy.book_id, copy.status))
+            apply_stock_changes(changes)
+
+    return results
+
+def rebuild_stock():
+    """Recount BranchStock from the copies, for after imports or raw SQL edits."""
+    counts = stock_changes()
+    for branch_id, book_id, status in (BookInstance.objects.filter(branch__isnull=False, book__isnull=False)
+                                       .values_list('branch_id', 'book_id', 'status').iterator()):
+        counts[(branch_id, book_id)][0] += 1
+        counts[(branch_id, book_id)][1] += status == 'a'
+    with transaction.atomic():
+        BranchStock.objects.all().delete()
+        BranchStock.objects.bulk_create(
+            BranchStock(branch_id=branch_id, book_id=book_id, copies=copies, available=available)
+            for (branch_id, book_id), (copies, available) in counts.items()
+        )
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+# Cached catalog data is keyed on a version number that the signal handlers in
+# catalog.signals bump whenever a book, author, genre or language changes, so
+# stale entries are never read again and simply expire.
+CATALOG_VERSION_KEY = 'catalog:version'
+
+def version(key, cache=cache):
+    """The current value of the version number stored at key."""
+    value = cache.get(key)
+    if value is None:
+        # start from the clock rather than 1 so a lost version key can't revive old entries
+        cache.add(key, int(time.time() * 1000), None)
+        value = cache.get(key)
+    return value
+
+def bump_version(key, cache=cache):
+    try:
+        cache.incr(key)
+    except ValueError:
+        version(key, cache)
+
+def catalog_version():
+    return version(CATALOG_VERSION_KEY)
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+# small, hot lookups that change rarely; the version in the key takes care of edits
+LOOKUP_CACHE_TIMEOUT = getattr(settings, 'CATALOG_LOOKUP_CACHE_TIMEOUT', 60 * 60)
+# copies change status without bumping the version, so the homepage counts just expire
+COUNTS_CACHE_TIMEOUT = getattr(settings, 'CATALOG_COUNTS_CACHE_TIMEOUT', 60)
+
+def cached(name, compute, timeout):
+    """compute() cached under catalog:<name> for the current catalog version."""
+    return cache.get_or_set(f'catalog:{name}:{catalog_version()}', compute, timeout)
+
+def genre_names():
+    """{pk: name} for every genre."""
+    return cached('genres', lambda: dict(Genre.objects.values_list('pk', 'name')), LOOKUP_CACHE_TIMEOUT)
+
+def language_names():
+    """{pk: name} for every language."""
+    return cached('languages', lambda: dict(Language.objects.values_list('pk', 'name')), LOOKUP_CACHE_TIMEOUT)
+
+def catalog_counts():
+    """The totals shown on the homepage."""
+    return cached('counts', lambda: {
+        'num_books': Book.objects.count(),
+        'num_instances': BookInstance.objects.count(),
+        'num_instances_available': BookInstance.objects.filter(status__exact='a').count(),
+        'num_authors': Author.objects.count(),
+        'num_genres': Genre.objects.count(),
+    }, COUNTS_CACHE_TIMEOUT)
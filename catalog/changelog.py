@@ -0,0 +1,80 @@
+"""
+Append-only log of catalog changes, for downstream systems to sync from.
+
+Every create, update and delete of a Book, Author, Genre, Language or
+BookInstance, and every link added or removed between a book and a genre,
+appends a Change row in the same transaction (see the handlers in
+catalog.signals and models.LoggedModel; bulk updates in catalog.circulation
+and catalog.branches record theirs explicitly). Deleting an author, language,
+book or user logs an update of each row whose reference to it is set to NULL. Consumers
+keep the id of the last change they processed as a cursor and ask for the
+changes after it, through the change-feed endpoint or `manage.py consume_changes`.
+
+Deleting a book also removes its genre links without a book_genre change;
+consumers should drop them along with the book. Derived counters such as
+Author.book_count and BranchStock aren't logged.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from catalog.models import Change
+
+BOOK_GENRE = 'book_genre'
+
+# Ids are handed out when a change is written but become visible when its
+# transaction commits, so a slow transaction can commit a lower id after a
+# consumer has read past it. The feed only serves changes older than this,
+# which covers any transaction shorter than it.
+FEED_LAG = timedelta(seconds=getattr(settings, 'CHANGE_FEED_LAG', 5))
+FEED_MAX_LIMIT = 1000
+
+def encode(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True) if data is not None else ''
+
+def row_data(instance, fields=None):
+    """The instance's field values, by column name: all of them, or just the given field names."""
+    loaded = instance.__dict__
+    return {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        # deferred fields weren't written, and reading them would query
+        if field.attname in loaded and (fields is None or field.name in fields or field.attname in fields)
+    }
+
+def record(instance, action, fields=None):
+    """Log a save or delete of instance; fields are the update_fields of a partial save."""
+    data = row_data(instance, fields) if action != Change.DELETE else None
+    Change.objects.create(model=instance._meta.model_name, object_id=str(instance.pk), action=action, data=encode(data))
+
+def record_updates(model, pks, data):
+    """Log the same update of data (column name: value) to the rows of model with the given pks."""
+    Change.objects.bulk_create(
+        Change(model=model._meta.model_name, object_id=str(pk), action=Change.UPDATE, data=encode(data)) for pk in pks
+    )
+
+def record_genre_links(action, pairs):
+    """Log book_genre links, given as (book_id, genre_id) pairs, being created or deleted."""
+    Change.objects.bulk_create(
+        Change(model=BOOK_GENRE, object_id=f'{book_id}:{genre_id}', action=action,
+               data=encode({'book_id': book_id, 'genre_id': genre_id}) if action == Change.CREATE else '')
+        for book_id, genre_id in pairs
+    )
+
+def serialize(change):
+    return {
+        'id': change.id,
+        'model': change.model,
+        'object_id': change.object_id,
+        'action': change.action,
+        'data': json.loads(change.data) if change.data else None,
+        'created': change.created,
+    }
+
+def changes_after(cursor, limit):
+    """Up to limit changes with ids greater than cursor, oldest first, as dicts."""
+    changes = Change.objects.filter(id__gt=cursor, created__lte=timezone.now() - FEED_LAG).order_by('id')[:limit]
+    return [serialize(change) for change in changes]
@@ -0,0 +1,98 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, Value
+from django.utils.http import urlencode
+
+from catalog.caching import catalog_version, genre_names, language_names
+from catalog.models import MAX_ID, Author, Book, Genre, Language
+
+# (query parameter, label, model) for each facet the book list can be filtered by
+FACETS = (
+    ('genre', 'Genre', Genre),
+    ('language', 'Language', Language),
+    ('author', 'Author', Author),
+)
+
+# the author facet can have a very long tail, so only the biggest values are listed
+AUTHOR_FACET_LIMIT = 20
+
+FACET_CACHE_TIMEOUT = getattr(settings, 'CATALOG_FACET_CACHE_TIMEOUT', 300)
+
+def _parse_id(value):
+    try:
+        pk = int(value)
+    except ValueError:
+        return None
+    return pk if 0 < pk <= MAX_ID else None
+
+def parse_filters(query_dict):
+    """Read the selected facet values out of the request's query parameters, ignoring anything that isn't an id."""
+    filters = {}
+    for name, label, model in FACETS:
+        filters[name] = sorted({pk for pk in map(_parse_id, query_dict.getlist(name)) if pk is not None})
+    return filters
+
+def querystring(filters):
+    """Query string for the selected facets, used to keep them across pages."""
+    return urlencode([(name, value) for name, values in sorted(filters.items()) for value in values])
+
+def filter_books(books, filters, exclude=None):
+    """Books matching any selected value within a facet and every facet with a selection."""
+    if filters['genre'] and exclude != 'genre':
+        # a subquery rather than a join, so the genre facet can still join the genres itself
+        tagged = Book.genre.through.objects.filter(genre_id__in=filters['genre']).values('book_id')
+        books = books.filter(pk__in=tagged)
+    if filters['language'] and exclude != 'language':
+        books = books.filter(language_id__in=filters['language'])
+    if filters['author'] and exclude != 'author':
+        books = books.filter(author_id__in=filters['author'])
+    return books
+
+def _facet_count_query(books, name):
+    return (books.order_by()
+            .annotate(facet=Value(name, output_field=CharField()))
+            .values('facet', name)
+            .annotate(count=Count('pk'))
+            .values_list('facet', name, 'count'))
+
+def facet_counts(filters):
+    """
+    Count the books for every value of every facet in one grouped UNION ALL query.
+
+    Each facet is counted against the books matching the selections in the
+    *other* facets, so choosing a genre doesn't hide the counts for the rest.
+    """
+    parts = [_facet_count_query(filter_books(Book.objects.all(), filters, exclude=name), name) for name, label, model in FACETS]
+    counts = {name: {} for name, label, model in FACETS}
+    for name, value, count in parts[0].union(*parts[1:], all=True):
+        if value is not None:
+            counts[name][value] = count
+
+    all_author_counts = counts['author']
+    counts['author'] = dict(sorted(all_author_counts.items(), key=lambda item: (-item[1], item[0]))[:AUTHOR_FACET_LIMIT])
+    for name, label, model in FACETS:
+        # selected values stay listed even when they are outside the top authors or match nothing
+        for pk in filters[name]:
+            counts[name][pk] = all_author_counts.get(pk, 0) if name == 'author' else counts[name].get(pk, 0)
+
+    facets = []
+    for name, label, model in FACETS:
+        if name == 'author':
+            names = {pk: str(author) for pk, author in Author.objects.in_bulk(counts[name]).items()}
+        else:
+            names = genre_names() if name == 'genre' else language_names()
+        options = [
+            {'pk': pk, 'name': names[pk], 'count': count, 'selected': pk in filters[name]}
+            for pk, count in counts[name].items() if pk in names
+        ]
+        options.sort(key=lambda option: (-option['count'], option['name']))
+        facets.append({'name': name, 'label': label, 'options': options})
+    return facets
+
+def cached_facet_counts(filters):
+    """facet_counts() cached per combination of selected facets."""
+    selection = hashlib.md5(querystring(filters).encode()).hexdigest()
+    key = f'catalog:facets:{catalog_version()}:{selection}'
+    return cache.get_or_set(key, lambda: facet_counts(filters), FACET_CACHE_TIMEOUT)
@@ -4,8 +4,19 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 
+from catalog.models import MAX_ID
+
+class VersionField(forms.IntegerField):
+    """Hidden field with the version of the object a form was rendered for, bounded so a tampered one is a form error."""
+    widget = forms.HiddenInput
+
+    def __init__(self, **kwargs):
+        super().__init__(**{'required': False, 'min_value': 0, 'max_value': MAX_ID, **kwargs})
+
 class RenewBookForm(forms.Form):
     renewal_date = forms.DateField(help_text="Enter a date between now and 4 weeks (default is 3).")
+    # the version of the copy the form was rendered for; without it the renewal applies to the copy as it is now
+    version = VersionField()
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
@@ -17,3 +28,16 @@ class RenewBookForm(forms.Form):
             raise ValidationError(_('Invalid date - date selected is more than 4 weeks from now.'))
 
         return data
+
+from django.contrib.auth.forms import PasswordResetForm
+from catalog.tasks import send_password_reset
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Password reset form that hands the email to the background task queue."""
+
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email, html_email_template_name=None):
+        # only what's needed to make the email again: the link's token is made by the task, so it isn't stored
+        user_pk = context['user'].pk
+        context = {name: value for name, value in context.items() if name not in ('user', 'uid', 'token')}
+        send_password_reset.delay(user_pk, context, subject_template_name, email_template_name,
+                                  from_email, html_email_template_name=html_email_template_name)
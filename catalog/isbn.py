@@ -0,0 +1,130 @@
+from collections import defaultdict
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils.translation import ugettext_lazy as _
+
+# ISBNs are stored in one canonical form - 13 digits, no hyphens - so that a
+# unique index can catch duplicates and a scanned ISBN-10 finds the same book.
+
+def _isbn10_check_digit(digits):
+    total = sum((10 - i) * int(digit) for i, digit in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+def _isbn13_check_digit(digits):
+    total = sum((3 if i % 2 else 1) * int(digit) for i, digit in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+def normalize_isbn(value):
+    """
+    Return the ISBN-13 form of an ISBN-10 or ISBN-13, ignoring hyphens and spaces.
+
+    Raises ValueError if the value isn't a well-formed ISBN with a correct check digit.
+    """
+    isbn = str(value).replace('-', '').replace(' ', '').upper()
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        if isbn[9] != _isbn10_check_digit(isbn):
+            raise ValueError(f'{value!r} has an invalid ISBN-10 check digit')
+        isbn = '978' + isbn[:9]
+        return isbn + _isbn13_check_digit(isbn)
+    if len(isbn) == 13 and isbn.isdigit():
+        if isbn[12] != _isbn13_check_digit(isbn):
+            raise ValueError(f'{value!r} has an invalid ISBN-13 check digit')
+        return isbn
+    raise ValueError(f'{value!r} is not an ISBN-10 or ISBN-13')
+
+def is_isbn(value):
+    """Whether the value is a well-formed ISBN-10 or ISBN-13."""
+    try:
+        normalize_isbn(value)
+    except ValueError:
+        return False
+    return True
+
+def validate_isbn(value):
+    try:
+        normalize_isbn(value)
+    except ValueError:
+        raise ValidationError(_('Enter a valid ISBN-10 or ISBN-13.'), code='invalid')
+
+# an ISBN-13 with its four hyphens, as printed on the back of a book
+ISBN_INPUT_MAX_LENGTH = 17
+
+class ISBNFormField(forms.CharField):
+    """Form field that accepts ISBNs as printed, hyphens and all, and cleans them to their canonical form."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['max_length'] = max(kwargs.get('max_length') or 0, ISBN_INPUT_MAX_LENGTH)
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        try:
+            return normalize_isbn(value) if value else value
+        except ValueError:
+            # left as is for the model field's validator to reject
+            return value
+
+def normalize_stored_isbns(book_model):
+    """
+    Rewrite stored ISBNs into their canonical form.
+
+    Returns the (pk, isbn) of books whose ISBN is invalid and was left alone.
+    """
+    invalid = []
+    for pk, isbn in book_model.objects.values_list('pk', 'isbn').iterator():
+        try:
+            normalized = normalize_isbn(isbn)
+        except ValueError:
+            invalid.append((pk, isbn))
+            continue
+        if normalized != isbn:
+            book_model.objects.filter(pk=pk).update(isbn=normalized)
+    return invalid
+
+def duplicated_isbns(book_model):
+    """ISBNs stored on more than one book, blank and invalid ones included."""
+    return list(book_model.objects.values('isbn').annotate(n=Count('pk')).filter(n__gt=1).order_by('isbn')
+                .values_list('isbn', flat=True))
+
+def merge_duplicate_books(book_model, bookinstance_model, dry_run=False):
+    """
+    Merge books that share a valid ISBN into the oldest of them.
+
+    Copies and genres of the duplicates are moved to the kept book before the
+    duplicates are deleted. Books sharing a blank or invalid ISBN aren't the
+    same book, so they're left for a librarian to correct. The models are
+    passed in so data migrations can use their historical versions. Returns a
+    list of (kept book, merged books).
+    """
+    # grouped by canonical form, so a dry run finds the same duplicates before the stored ISBNs are normalized
+    books_by_isbn = defaultdict(list)
+    for pk, isbn in book_model.objects.order_by('pk').values_list('pk', 'isbn').iterator():
+        try:
+            books_by_isbn[normalize_isbn(isbn)].append(pk)
+        except ValueError:
+            continue
+    merged = []
+    for pks in books_by_isbn.values():
+        if len(pks) < 2:
+            continue
+        # only the columns every version of the table has, so a dry run also works before migrating
+        kept, *duplicates = book_model.objects.filter(pk__in=pks).order_by('pk').only('pk', 'isbn')
+        merged.append((kept, duplicates))
+        if dry_run:
+            continue
+        duplicate_ids = [book.pk for book in duplicates]
+        with transaction.atomic():
+            moved = {'book': kept}
+            # the historical models of older migrations have no version to move on
+            if any(field.name == 'version' for field in bookinstance_model._meta.concrete_fields):
+                moved['version'] = F('version') + 1
+            bookinstance_model.objects.filter(book_id__in=duplicate_ids).update(**moved)
+            genre_ids = book_model.genre.through.objects.filter(book_id__in=duplicate_ids).values_list('genre_id', flat=True)
+            kept.genre.add(*set(genre_ids))
+            for book in duplicates:
+                book.delete()
+    return merged
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog import recommendations
+
+class Command(BaseCommand):
+    help = 'Update the "readers also borrowed" neighbors from new checkouts, or rebuild them all with --full.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every book instead of only those affected by new checkouts.')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            books = recommendations.rebuild_neighbors()
+        else:
+            books = recommendations.update_neighbors()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed neighbors for {books} book(s).'))
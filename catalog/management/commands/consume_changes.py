@@ -0,0 +1,62 @@
+import json
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+from catalog import changelog
+
+class Command(BaseCommand):
+    help = ('Write catalog changes after the cursor in --cursor-file to stdout as JSON lines, '
+            'saving the new cursor after each batch. Pipe into a sync job: changes are delivered at least once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cursor-file', required=True, help='Holds the id of the last change written; created if missing.')
+        parser.add_argument('--batch', type=int, default=500, help=f'Changes per batch, at most {changelog.FEED_MAX_LIMIT}.')
+        parser.add_argument('--follow', action='store_true', help='Keep waiting for new changes instead of exiting once caught up.')
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait for new changes with --follow.')
+
+    def handle(self, *args, **options):
+        if not 0 < options['batch'] <= changelog.FEED_MAX_LIMIT:
+            raise CommandError(f'--batch must be between 1 and {changelog.FEED_MAX_LIMIT}')
+        cursor_file = options['cursor_file']
+        cursor = self.read_cursor(cursor_file)
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            close_old_connections()
+            changes = changelog.changes_after(cursor, options['batch'])
+            for change in changes:
+                self.stdout.write(json.dumps(change, cls=DjangoJSONEncoder))
+            if changes:
+                self.stdout.flush()
+                cursor = changes[-1]['id']
+                self.write_cursor(cursor_file, cursor)
+            if len(changes) < options['batch']:
+                if not options['follow']:
+                    break
+                time.sleep(options['sleep'])
+
+    def read_cursor(self, path):
+        try:
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError(f'{path} does not hold a change id')
+
+    def write_cursor(self, path, cursor):
+        # written aside and renamed, so a crash never leaves a half written cursor
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(f'{cursor}\n')
+        os.replace(f'{path}.tmp', path)
+
+    def stop(self, signum, frame):
+        # finish the current batch, then exit
+        self.stopping = True
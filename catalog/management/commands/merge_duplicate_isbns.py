@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from catalog.authors import rebuild_counts
+from catalog.branches import rebuild_stock
+from catalog import changelog
+from catalog.isbn import duplicated_isbns, is_isbn, merge_duplicate_books, normalize_stored_isbns
+from catalog.models import Book, BookInstance
+
+class Command(BaseCommand):
+    help = 'Normalize stored ISBNs, report invalid ones and merge books that share an ISBN.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the duplicates without merging them.')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            for pk, isbn in normalize_stored_isbns(Book):
+                self.stdout.write(self.style.WARNING(f'Book {pk} has an invalid ISBN: {isbn!r}'))
+
+        merged = merge_duplicate_books(Book, BookInstance, dry_run=options['dry_run'])
+        verb = 'Would merge' if options['dry_run'] else 'Merged'
+        for kept, duplicates in merged:
+            ids = ', '.join(str(book.pk) for book in duplicates)
+            self.stdout.write(f'{verb} books {ids} into book {kept.pk} ({kept.isbn})')
+            if not options['dry_run']:
+                # the copies were moved with a bulk update, which the change log doesn't see
+                copies = BookInstance.objects.filter(book=kept).values_list('pk', flat=True)
+                changelog.record_updates(BookInstance, list(copies), {'book_id': kept.pk})
+        if merged and not options['dry_run']:
+            # the copies were moved with a bulk update, so recount what each branch and author holds
+            rebuild_stock()
+            rebuild_counts()
+        for isbn in (isbn for isbn in duplicated_isbns(Book) if not is_isbn(isbn)):
+            ids = ', '.join(str(pk) for pk in Book.objects.filter(isbn=isbn).order_by('pk').values_list('pk', flat=True))
+            self.stdout.write(self.style.WARNING(f'Books {ids} share the invalid ISBN {isbn!r}; correct them by hand'))
+        self.stdout.write(self.style.SUCCESS(f'{len(merged)} duplicated ISBN(s) found.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from catalog.authors import rebuild_counts
+
+class Command(BaseCommand):
+    help = 'Recount the books and copies of every author.'
+
+    def handle(self, *args, **options):
+        count = rebuild_counts()
+        self.stdout.write(self.style.SUCCESS(f'{count} author(s) recounted.'))
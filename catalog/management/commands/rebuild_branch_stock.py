@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.branches import rebuild_stock
+from catalog.models import BranchStock
+
+class Command(BaseCommand):
+    help = 'Recount the copies each branch holds of each book.'
+
+    def handle(self, *args, **options):
+        rebuild_stock()
+        self.stdout.write(self.style.SUCCESS(f'{BranchStock.objects.count()} branch stock row(s) rebuilt.'))
@@ -0,0 +1,25 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from catalog import static_export
+
+class Command(BaseCommand):
+    help = 'Pre-render the public book and author pages and sitemap.xml into a directory for static serving.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.CATALOG_STATIC_EXPORT_DIR, help='Directory to write the pages to.')
+        parser.add_argument('--host', default=settings.ALLOWED_HOSTS[0], help='Host name used for the absolute urls in sitemap.xml.')
+        parser.add_argument('--insecure', action='store_true', help='Use http:// rather than https:// urls in sitemap.xml.')
+        parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Worker processes used to render pages.')
+        parser.add_argument('--full', action='store_true', help='Render every page, not only those that changed since the last run.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rendered, removed = static_export.build(options['output'], options['host'], secure=not options['insecure'], jobs=options['jobs'], full=options['full'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(rendered)} page(s) and removed {len(removed)} into {options["output"]} in {elapsed:.2f}s.'
+        ))
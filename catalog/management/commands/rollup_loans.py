@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import reports
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'{value!r} is not a date in YYYY-MM-DD format')
+
+class Command(BaseCommand):
+    help = 'Fold new loan events into the daily rollups, or rebuild a date range with --since.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help='First day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--until', type=parse_date, help='Last day to rebuild (YYYY-MM-DD), defaults to today.')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes used to aggregate a rebuild.')
+        parser.add_argument('--partition-days', type=int, default=7, help='Days aggregated by each worker at a time.')
+
+    def handle(self, *args, **options):
+        if options['since'] is None:
+            days = reports.update_rollups()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups for {len(days)} day(s).'))
+            return
+
+        until = options['until'] or datetime.date.today()
+        if options['since'] > until:
+            raise CommandError('--since must not be after --until')
+        partitions = reports.backfill_rollups(options['since'], until, processes=options['processes'], partition_days=options['partition_days'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups from {options["since"]} to {until} in {partitions} partition(s).'))
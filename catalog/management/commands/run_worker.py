@@ -0,0 +1,52 @@
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from catalog import taskqueue
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}', help='Name recorded on the tasks this worker claims.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        taskqueue.autodiscover()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker_id = options['worker_id']
+        self.stdout.write(f'Worker {worker_id} running tasks: {", ".join(sorted(taskqueue.registry))}')
+        while not self.stopping:
+            close_old_connections()
+            requeued, failed = taskqueue.requeue_stale()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale task(s)'))
+            if failed:
+                self.stdout.write(self.style.ERROR(f'Failed {failed} stale task(s) out of attempts'))
+
+            claimed = taskqueue.claim(worker_id)
+            if claimed is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            try:
+                taskqueue.run(claimed)
+            except taskqueue.LostLock as error:
+                self.stdout.write(self.style.WARNING(f'{error}; its result was not recorded'))
+                continue
+            style = self.style.SUCCESS if claimed.status == claimed.DONE else self.style.ERROR
+            self.stdout.write(style(f'{claimed.name} #{claimed.pk}: {claimed.get_status_display()} in {claimed.duration:.3f}s'))
+
+    def stop(self, signum, frame):
+        # finish the current task, then exit
+        self.stopping = True
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.taskqueue import task_stats
+
+class Command(BaseCommand):
+    help = 'Show per-task queue counts and run timings.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"task":<40} {"queued":>7} {"running":>7} {"done":>7} {"failed":>7} {"avg s":>9} {"max s":>9}')
+        for row in task_stats():
+            avg = f'{row["avg_duration"]:.3f}' if row['avg_duration'] is not None else '-'
+            longest = f'{row["max_duration"]:.3f}' if row['max_duration'] is not None else '-'
+            self.stdout.write(f'{row["name"]:<40} {row["queued"]:>7} {row["running"]:>7} {row["done"]:>7} {row["failed"]:>7} {avg:>9} {longest:>9}')
@@ -0,0 +1,176 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from catalog import profiling
+
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+def parse_rate(rate):
+    """'120/m' -> tokens added to the bucket per second."""
+    count, unit = rate.split('/')
+    return int(count) / RATE_UNITS[unit]
+
+class RateLimitMiddleware:
+    """
+    Admission control for expensive views, using token buckets in a shared cache.
+
+    settings.RATE_LIMITS names a dict (normally catalog.urls.rate_limits) that
+    maps url names to limits like::
+
+        {'ip': '120/m', 'user': '30/m', 'burst': 20, 'page_cost_step': 10}
+
+    Each client IP, and each logged in user for 'user', gets a bucket holding
+    up to `burst` tokens that refills at the given rate. A request costs one
+    token, plus one more for every `page_cost_step` pages deep it asks for, up
+    to the whole burst, so the deepest pages still get through on a full
+    bucket. When a bucket is empty the request is refused with a bare 429
+    before the view runs. The IP bucket is checked before the session or the
+    user is loaded, so requests it sheds never touch the database; every limit
+    with a 'user' rate should have an 'ip' one too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        limits = getattr(settings, 'RATE_LIMITS', None)
+        self.limits = import_string(limits) if isinstance(limits, str) else limits
+        if not self.limits:
+            raise MiddlewareNotUsed
+        self.cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+        self.forwarded_for = getattr(settings, 'RATE_LIMIT_FORWARDED_FOR', False)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        limit = self.limits.get(url_name)
+        if limit is None:
+            return None
+
+        cost = self.cost(request, view_kwargs, limit)
+        for scope, client in self.clients(request, limit):
+            retry_after = self.take(f'ratelimit:{url_name}:{scope}:{client}', parse_rate(limit[scope]), limit.get('burst', 10), cost)
+            if retry_after:
+                response = HttpResponse('Too many requests, please slow down.', status=429, content_type='text/plain')
+                response['Retry-After'] = str(math.ceil(retry_after))
+                return response
+        return None
+
+    def clients(self, request, limit):
+        """The (scope, client) buckets a request is charged to, in the order they're checked."""
+        if 'ip' in limit:
+            yield 'ip', self.client_ip(request)
+        # only reached once the ip bucket has admitted the request, since it loads the session and user; keyed on
+        # the user rather than the session cookie, which a client can change on every request for a fresh bucket
+        if 'user' in limit and request.user.is_authenticated:
+            yield 'user', request.user.pk
+
+    def cost(self, request, view_kwargs, limit):
+        step = limit.get('page_cost_step')
+        if not step:
+            return 1
+        page = view_kwargs.get('page') or request.GET.get('page', '1')
+        try:
+            page = int(page)
+        except ValueError:
+            return 1
+        # never more than a full bucket holds, or the request could never be admitted
+        return min(limit.get('burst', 10), 1 + max(page - 1, 0) // step)
+
+    def client_ip(self, request):
+        if self.forwarded_for and 'HTTP_X_FORWARDED_FOR' in request.META:
+            # the last address is the one added by our own proxy, the rest can be forged
+            return request.META['HTTP_X_FORWARDED_FOR'].split(',')[-1].strip()
+        return request.META.get('REMOTE_ADDR', '')
+
+    def take(self, key, rate, burst, cost):
+        """
+        Take cost tokens from the bucket at key. Returns 0 on success, or the seconds until enough are back.
+
+        The read-modify-write isn't atomic, so concurrent requests can
+        occasionally both spend the same token; the limit is approximate.
+        """
+        now = time.time()
+        tokens, updated = self.cache.get(key) or (burst, now)
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / rate
+        self.cache.set(key, (tokens, now), math.ceil(burst / rate) + 1)
+        return retry_after
+
+class ProfilingMiddleware:
+    """
+    Profiles requests on demand and writes the results to settings.PROFILING_DIR.
+
+    Staff trigger it with an X-Profile header or a ?profile query parameter
+    (either may name the mode, 'sample' or 'cprofile'), and a random
+    PROFILING_SAMPLE_RATE share of all requests is profiled too. Without a
+    PROFILING_DIR the middleware removes itself, so it costs nothing when off.
+    Must come after AuthenticationMiddleware.
+
+    Profiles are readable by every staff user, so the url arguments of the
+    routes named in PROFILING_REDACTED_URLS, which carry secrets such as
+    password reset tokens, are recorded as '*'.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.directory = getattr(settings, 'PROFILING_DIR', None)
+        if not self.directory:
+            raise MiddlewareNotUsed
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.mode = getattr(settings, 'PROFILING_MODE', profiling.SAMPLE)
+        self.interval = getattr(settings, 'PROFILING_INTERVAL', 0.005)
+        self.keep = getattr(settings, 'PROFILING_KEEP', 200)
+        self.redacted = set(getattr(settings, 'PROFILING_REDACTED_URLS', ('password_reset_confirm',)))
+
+    def __call__(self, request):
+        requested = request.META.get('HTTP_X_PROFILE', request.GET.get('profile'))
+        if requested is not None and request.user.is_staff:
+            trigger = 'staff'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sampled'
+        else:
+            return self.get_response(request)
+
+        mode = requested if requested in profiling.MODES else self.mode
+        started = timezone.now()
+        start = time.perf_counter()
+        response, profiler, recorder = profiling.profile(self.get_response, request, mode, self.interval)
+        info = {
+            'method': request.method,
+            'path': self.recorded_path(request),
+            'status': response.status_code,
+            'user': request.user.get_username() if request.user.is_authenticated else None,
+            'trigger': trigger,
+            'mode': mode,
+            'started': started.isoformat(),
+            'duration': time.perf_counter() - start,
+            'sql_duration': sum(query['duration'] for query in recorder.queries),
+            'queries': recorder.queries,
+        }
+        response['X-Profile'] = profiling.save_profile(self.directory, profiler, info, self.keep)
+        return response
+
+    def recorded_path(self, request):
+        """The request's path and query string, with those of redacted routes left out."""
+        match = request.resolver_match
+        if match is None or match.url_name not in self.redacted:
+            return request.get_full_path()
+        try:
+            return reverse(match.view_name, args=['*'] * len(match.args), kwargs={name: '*' for name in match.kwargs})
+        except NoReverseMatch:
+            # arguments a '*' doesn't fit, such as <int:...>
+            return f'<{match.view_name}>'
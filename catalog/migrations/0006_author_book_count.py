@@ -0,0 +1,37 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_books(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    counts = Book.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(n=Count('pk')).values('n')
+    Author.objects.update(book_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_book_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_books, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='author',
+            name='date_of_birth',
+            field=models.DateField(blank=True, null=True, verbose_name='Born'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'title', 'id'], name='book_author_title_idx'),
+        ),
+    ]
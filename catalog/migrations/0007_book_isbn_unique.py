@@ -0,0 +1,35 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:15
+
+import catalog.models
+from catalog.isbn import duplicated_isbns, normalize_stored_isbns
+from django.core.management.base import CommandError
+from django.db import migrations
+
+
+def normalize_isbns(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+
+    normalize_stored_isbns(Book)
+    # the unique index can't be built while duplicates remain, and merging books is for a librarian to decide
+    duplicated = duplicated_isbns(Book)
+    if duplicated:
+        raise CommandError(
+            f'{len(duplicated)} ISBN(s) are shared by more than one book: {", ".join(repr(isbn) for isbn in duplicated)}. '
+            'List them with "manage.py merge_duplicate_isbns --dry-run", merge or correct them, then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_author_book_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_isbns, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='isbn',
+            field=catalog.models.ISBNField(help_text='10 or 13 digit <a href="https://www.isbn-international.org/content/what-isbn">ISBN number</a>', max_length=13, unique=True, verbose_name='ISBN'),
+        ),
+    ]
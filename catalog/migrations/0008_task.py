@@ -0,0 +1,40 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:17
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_book_isbn_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Registered name of the task function', max_length=200)),
+                ('arguments', models.TextField(default='{}', help_text='JSON encoded positional and keyword arguments')),
+                ('status', models.CharField(choices=[('q', 'Queued'), ('r', 'Running'), ('d', 'Done'), ('f', 'Failed')], default='q', max_length=1)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=200)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, help_text='Seconds taken by the last attempt', null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_after'], name='task_claim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['name', 'status'], name='task_name_status_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0008_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookLoans',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('checkouts', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('renewals', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.Book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyGenreLoans',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('checkouts', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('renewals', models.PositiveIntegerField(default=0)),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.Genre')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyLanguageLoans',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('checkouts', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('renewals', models.PositiveIntegerField(default=0)),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.Language')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('c', 'Checkout'), ('r', 'Return'), ('n', 'Renewal')], max_length=1)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.Book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('copy', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.BookInstance')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LoanRollupState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailylanguageloans',
+            unique_together={('day', 'language')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailygenreloans',
+            unique_together={('day', 'genre')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailybookloans',
+            unique_together={('day', 'book')},
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_book_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('address', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BranchStock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('copies', models.PositiveIntegerField(default=0)),
+                ('available', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='branchstock',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.Book'),
+        ),
+        migrations.AddField(
+            model_name='branchstock',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='catalog.Branch'),
+        ),
+        migrations.AddField(
+            model_name='bookinstance',
+            name='branch',
+            field=models.ForeignKey(blank=True, help_text='Branch holding this copy', null=True, on_delete=django.db.models.deletion.PROTECT, to='catalog.Branch'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['branch', 'book', 'status'], name='copy_branch_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['branch', 'status', 'due_back'], name='copy_branch_status_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='branchstock',
+            unique_together={('branch', 'book')},
+        ),
+    ]
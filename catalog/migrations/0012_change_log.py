@@ -0,0 +1,28 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_branches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(help_text='Model name, or book_genre for a link between a book and a genre', max_length=50)),
+                ('object_id', models.CharField(help_text='Primary key, or book_id:genre_id for a book_genre link', max_length=100)),
+                ('action', models.CharField(choices=[('c', 'Create'), ('u', 'Update'), ('d', 'Delete')], max_length=1)),
+                ('data', models.TextField(blank=True, help_text='JSON encoded field values written by the change; empty for deletes')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'permissions': (('can_read_changes', 'Read the catalog change feed'),),
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookinstance',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
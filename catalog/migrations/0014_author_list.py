@@ -0,0 +1,67 @@
+# Generated by Django 2.1.7 on 2026-10-19 19:56
+
+import catalog.models
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr, Upper
+
+
+def fill_author_columns(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    copies = (BookInstance.objects.filter(book__author=OuterRef('pk')).order_by()
+              .values('book__author').annotate(n=Count('pk')).values('n'))
+    Author.objects.update(copy_count=Coalesce(Subquery(copies), 0), initial=Upper(Substr('last_name', 1, 1)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='copy_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='initial',
+            field=catalog.models.InitialField('last_name'),
+        ),
+        migrations.RunPython(fill_author_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['-book_count', 'last_name', 'first_name', 'id'], name='author_books_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['-copy_count', 'last_name', 'first_name', 'id'], name='author_copies_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['date_of_birth', 'last_name', 'first_name', 'id'], name='author_born_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['initial', 'last_name', 'first_name', 'id'], name='author_initial_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['initial', '-book_count', 'last_name', 'first_name', 'id'], name='author_initial_books_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['initial', '-copy_count', 'last_name', 'first_name', 'id'], name='author_initial_copies_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['initial', 'date_of_birth', 'last_name', 'first_name', 'id'], name='author_initial_born_idx'),
+        ),
+    ]
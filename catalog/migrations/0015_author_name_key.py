@@ -0,0 +1,31 @@
+# Generated by Django 2.1.7 on 2026-10-19 20:27
+
+import catalog.models
+from django.db import migrations, models
+
+
+def fill_name_keys(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    # upper-cased in Python, as saves do, since databases differ on anything beyond ASCII
+    for pk, last_name in Author.objects.values_list('pk', 'last_name').iterator():
+        Author.objects.filter(pk=pk).update(name_key=last_name.upper()[:200])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_author_list'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='name_key',
+            field=catalog.models.UpperCaseField('last_name', max_length=200),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name_key'], name='author_name_key_idx'),
+        ),
+    ]
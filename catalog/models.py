@@ -2,8 +2,29 @@ from django.db import models
 from django.contrib.auth.models import User
 from datetime import date
 
+# the largest primary key an AutoField holds on every supported database, for checking ids read from query strings
+MAX_ID = 2 ** 31 - 1
+
+from django.db import router, transaction
+
+class LoggedModel(models.Model):
+    """
+    A model whose saves are appended to the change log (see catalog.changelog).
+
+    The change is logged by a post_save handler, which Django sends after the
+    save's own transaction has ended, so the save is wrapped in one that also
+    covers the handlers: the row and its Change commit or roll back together.
+    """
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
 # Create your models here.
-class Genre(models.Model):
+class Genre(LoggedModel):
     """Model representing a book genre."""
     name = models.CharField(max_length=200, help_text='Enter a book genre (e.g. Science Fiction)')
 
@@ -11,23 +32,103 @@ class Genre(models.Model):
         """String for representing the Model object."""
         return self.name
 
-class Language(models.Model):
+class Language(LoggedModel):
     name = models.CharField(max_length=50, help_text="Enter the book's natural language (e.g. English, French, Japanese etc.)")
 
     def __str__(self):
         return self.name
 
 from django.urls import reverse
+from catalog.isbn import ISBNFormField, normalize_isbn, validate_isbn
+
+class ISBNField(models.CharField):
+    """CharField that stores ISBN-10s and ISBN-13s in their canonical 13 digit form."""
+    default_validators = [validate_isbn]
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 13)
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        try:
+            return normalize_isbn(value)
+        except ValueError:
+            # left as is for the validator to reject
+            return value
+
+    def get_prep_value(self, value):
+        # lets lookups like filter(isbn='0-306-40615-2') find the stored ISBN-13
+        return self.to_python(super().get_prep_value(value))
+
+    def formfield(self, **kwargs):
+        # max_length limits the stored form, not what can be typed in
+        return super().formfield(**{'form_class': ISBNFormField, **kwargs})
 
-class Book(models.Model):
+class ConcurrentUpdate(Exception):
+    """Raised by VersionedModel.save_changes() when the row was changed or deleted after it was read."""
+
+class VersionedModel(LoggedModel):
+    """
+    A model whose rows carry a version number, moved on by every update.
+
+    Edit forms keep the version they were rendered with and write through
+    save_changes(), which updates only the changed fields and only while the
+    row is still at that version, so concurrent edits conflict instead of
+    silently overwriting each other, without holding any locks.
+    """
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save_changes(self, fields, version=None):
+        """
+        Write just the given fields, if the row is still at version (by default
+        the version this instance was read at), or raise ConcurrentUpdate.
+
+        With no fields only the version is moved on, which still guards
+        changes made elsewhere, such as to many-to-many fields.
+        """
+        self._expected_version = self.version if version is None else version
+        try:
+            # a savepoint, so a conflict inside a caller's transaction leaves it usable
+            with transaction.atomic(using=router.db_for_write(type(self), instance=self)):
+                self.save(update_fields=list(fields) or ['version'])
+        finally:
+            del self._expected_version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        version = self._meta.get_field('version')
+        values = [value for value in values if value[0] is not version]
+        values.append((version, None, models.F('version') + 1))
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            updated = super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+            if updated:
+                # only the database knows the new version; it's read again if it's used
+                self.__dict__.pop('version', None)
+            return updated
+        if not base_qs.filter(pk=pk_val, version=expected)._update(values):
+            raise ConcurrentUpdate(f'{self._meta.verbose_name} {pk_val} is no longer at version {expected}')
+        self.version = expected + 1
+        return True
+
+class Book(VersionedModel):
     """Model representing a book"""
     title = models.CharField(max_length=200)
     author = models.ForeignKey('Author', on_delete=models.SET_NULL, null=True)
     summary = models.TextField(max_length=1000, help_text='Enter a brief description of the book')
-    isbn = models.CharField('ISBN', max_length=13, help_text='13 Character <a href="https://www.isbn-international.org/content/what-isbn">ISBN number</a>')
+    isbn = ISBNField('ISBN', unique=True, help_text='10 or 13 digit <a href="https://www.isbn-international.org/content/what-isbn">ISBN number</a>')
     genre = models.ManyToManyField(Genre, help_text='Select a genre for this book')
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            # backs the keyset-paginated book list on the author detail page
+            models.Index(fields=['author', 'title', 'id'], name='book_author_title_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -41,15 +142,31 @@ class Book(models.Model):
 
     display_genre.short_description = 'Genre'
 
+class Branch(models.Model):
+    """Model representing a library branch, where copies of books are kept"""
+    name = models.CharField(max_length=100, unique=True)
+    address = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def get_absolute_url(self):
+        """Returns the url to access the books held by this branch."""
+        return reverse('branch-books', args=[str(self.id)])
+
+    def __str__(self):
+        return self.name
+
 import uuid
 
-class BookInstance(models.Model):
+class BookInstance(VersionedModel):
     """Model representing a specific copy of a book"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='Unique ID for this particular book across whole library')
     book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True)
     imprint = models.CharField(max_length=200)
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    branch = models.ForeignKey('Branch', on_delete=models.PROTECT, null=True, blank=True, help_text='Branch holding this copy')
 
     LOAN_STATUS = (
         ('m', 'Maintenance'),
@@ -69,6 +186,11 @@ class BookInstance(models.Model):
     class Meta:
         ordering = ['due_back']
         permissions = (("can_mark_returned", "Set book as returned"),)
+        # branch pages only ever look at one branch's copies, so branch leads
+        indexes = [
+            models.Index(fields=['branch', 'book', 'status'], name='copy_branch_book_idx'),
+            models.Index(fields=['branch', 'status', 'due_back'], name='copy_branch_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id} ({self.book.title})'
@@ -78,14 +200,78 @@ class BookInstance(models.Model):
             return True
         return False
 
-class Author(models.Model):
+class UpperCaseField(models.CharField):
+    """Another field's value upper-cased, set whenever a row is saved or bulk created, for matching it in either case."""
+
+    def __init__(self, source, *args, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['editable'], kwargs['default']
+        return name, path, [self.source, *args], kwargs
+
+    def upper_case(self, value):
+        # upper-casing can lengthen a string ('ß' is 'SS')
+        return value.upper()[:self.max_length]
+
+    def pre_save(self, model_instance, add):
+        value = self.upper_case(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+class InitialField(UpperCaseField):
+    """The upper-cased first character of another field."""
+
+    def __init__(self, source, *args, **kwargs):
+        kwargs.setdefault('max_length', 1)
+        super().__init__(source, *args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['max_length']
+        return name, path, args, kwargs
+
+    def upper_case(self, value):
+        return value[:1].upper()
+
+class Author(VersionedModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField('Born', null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    # kept up to date by the signal handlers in catalog.signals
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+    copy_count = models.PositiveIntegerField(default=0, editable=False)
+    # filters the author list by the first letter of last_name, and by longer name prefixes, in either case
+    initial = InitialField('last_name')
+    name_key = UpperCaseField('last_name', max_length=200)
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        # one index per sort of the author list (see catalog.authors), alone and after the initial
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_idx'),
+            models.Index(fields=['-book_count', 'last_name', 'first_name', 'id'], name='author_books_idx'),
+            models.Index(fields=['-copy_count', 'last_name', 'first_name', 'id'], name='author_copies_idx'),
+            models.Index(fields=['date_of_birth', 'last_name', 'first_name', 'id'], name='author_born_idx'),
+            models.Index(fields=['initial', 'last_name', 'first_name', 'id'], name='author_initial_name_idx'),
+            models.Index(fields=['initial', '-book_count', 'last_name', 'first_name', 'id'], name='author_initial_books_idx'),
+            models.Index(fields=['initial', '-copy_count', 'last_name', 'first_name', 'id'], name='author_initial_copies_idx'),
+            models.Index(fields=['initial', 'date_of_birth', 'last_name', 'first_name', 'id'], name='author_initial_born_idx'),
+            # for a longer prefix, narrow enough that the database may read the matches from it and sort them
+            models.Index(fields=['name_key'], name='author_name_key_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'last_name' in update_fields:
+            # the initial and name key are only written along with the last name they come from
+            kwargs['update_fields'] = {*update_fields, 'initial', 'name_key'}
+        super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         """Returns the url to access a particular author instance."""
@@ -93,3 +279,148 @@ class Author(models.Model):
 
     def __str__(self):
         return f'{self.last_name}, {self.first_name}'
+
+from django.utils import timezone
+
+class Task(models.Model):
+    """A unit of background work queued in the database and run by `manage.py run_worker`."""
+    QUEUED = 'q'
+    RUNNING = 'r'
+    DONE = 'd'
+    FAILED = 'f'
+    TASK_STATUS = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200, help_text='Registered name of the task function')
+    arguments = models.TextField(default='{}', help_text='JSON encoded positional and keyword arguments')
+    status = models.CharField(max_length=1, choices=TASK_STATUS, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=200, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True, help_text='Seconds taken by the last attempt')
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # workers claim the oldest due task
+            models.Index(fields=['status', 'run_after'], name='task_claim_idx'),
+            models.Index(fields=['name', 'status'], name='task_name_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
+
+class LoanEvent(models.Model):
+    """A checkout, return or renewal of a copy. Rows are only ever appended, never changed."""
+    CHECKOUT = 'c'
+    RETURN = 'r'
+    RENEWAL = 'n'
+    EVENT_KIND = (
+        (CHECKOUT, 'Checkout'),
+        (RETURN, 'Return'),
+        (RENEWAL, 'Renewal'),
+    )
+
+    copy = models.ForeignKey('BookInstance', on_delete=models.SET_NULL, null=True)
+    book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True)
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    kind = models.CharField(max_length=1, choices=EVENT_KIND)
+    due_back = models.DateField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'{self.get_kind_display()} of {self.copy_id} at {self.created}'
+
+class DailyLoanCounts(models.Model):
+    """Loan events of one day, summed by the rollup job in catalog.reports."""
+    day = models.DateField()
+    checkouts = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    renewals = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+class DailyBookLoans(DailyLoanCounts):
+    book = models.ForeignKey('Book', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('day', 'book')
+
+class DailyGenreLoans(DailyLoanCounts):
+    genre = models.ForeignKey('Genre', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('day', 'genre')
+
+class DailyLanguageLoans(DailyLoanCounts):
+    language = models.ForeignKey('Language', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('day', 'language')
+
+class LoanRollupState(models.Model):
+    """Single row recording the last loan event folded into the daily rollups."""
+    last_event_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+class BookNeighbor(models.Model):
+    """One of a book's top "readers also borrowed" books, precomputed by catalog.recommendations."""
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(help_text='Number of borrowers who had both books')
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        # the detail page reads a book's neighbors in rank order through this index
+        unique_together = ('book', 'rank')
+
+class RecommendationState(models.Model):
+    """Single row recording the last loan event folded into the book neighbors."""
+    last_event_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+class BranchStock(models.Model):
+    """How many copies of a book a branch holds and has available, kept up to date by catalog.branches."""
+    branch = models.ForeignKey('Branch', on_delete=models.CASCADE, related_name='stock')
+    book = models.ForeignKey('Book', on_delete=models.CASCADE)
+    copies = models.PositiveIntegerField(default=0)
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('branch', 'book')
+
+    def __str__(self):
+        return f'{self.available}/{self.copies} of {self.book_id} at {self.branch_id}'
+
+class Change(models.Model):
+    """One create, update or delete of a catalog row, appended by catalog.changelog. The id is the feed cursor."""
+    CREATE = 'c'
+    UPDATE = 'u'
+    DELETE = 'd'
+    CHANGE_ACTION = (
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=50, help_text='Model name, or book_genre for a link between a book and a genre')
+    object_id = models.CharField(max_length=100, help_text='Primary key, or book_id:genre_id for a book_genre link')
+    action = models.CharField(max_length=1, choices=CHANGE_ACTION)
+    data = models.TextField(blank=True, help_text='JSON encoded field values written by the change; empty for deletes')
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        permissions = (("can_read_changes", "Read the catalog change feed"),)
+
+    def __str__(self):
+        return f'{self.get_action_display()} of {self.model} {self.object_id}'
@@ -0,0 +1,136 @@
+"""
+Per-request profiles, captured by catalog.middleware.ProfilingMiddleware.
+
+A profile is either a statistical stack sample in collapsed format (one
+"frame;frame;frame count" line per distinct stack, which flamegraph.pl and
+speedscope read directly) or a cProfile dump, written next to a JSON file
+describing the request and every SQL statement it ran, with timings.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+from django.utils import timezone
+
+SAMPLE = 'sample'
+CPROFILE = 'cprofile'
+MODES = (SAMPLE, CPROFILE)
+
+# only files we wrote can be downloaded from the staff page
+PROFILE_FILE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}\.(json|collapsed|prof)$')
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a background thread every interval seconds."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+class QueryRecorder:
+    """A connection.execute_wrapper() that records every statement and how long it took."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'duration': time.perf_counter() - start,
+                'many': many,
+            })
+
+def profile(get_response, request, mode=SAMPLE, interval=0.005):
+    """Run get_response(request) under the profiler, returning (response, profiler, recorder)."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        if mode == CPROFILE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        else:
+            profiler = StackSampler(threading.get_ident(), interval)
+            profiler.start()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.stop()
+    return response, profiler, recorder
+
+def save_profile(directory, profiler, info, keep=None):
+    """Write the profile and its info (plus the file names) to directory, returning the info file's name."""
+    os.makedirs(directory, exist_ok=True)
+    name = f'{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+    if isinstance(profiler, cProfile.Profile):
+        info['profile'] = f'{name}.prof'
+        profiler.dump_stats(os.path.join(directory, info['profile']))
+    else:
+        info['profile'] = f'{name}.collapsed'
+        with open(os.path.join(directory, info['profile']), 'w') as f:
+            f.write(profiler.collapsed())
+    info['name'] = f'{name}.json'
+    with open(os.path.join(directory, info['name']), 'w') as f:
+        json.dump(info, f, indent=1)
+    if keep:
+        prune(directory, keep)
+    return info['name']
+
+def list_profiles(directory):
+    """The info of every saved profile, newest first."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json') and PROFILE_FILE.match(name):
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+    return profiles
+
+def prune(directory, keep):
+    """Delete all but the newest keep profiles."""
+    for info in list_profiles(directory)[keep:]:
+        for name in (info['name'], info['profile']):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
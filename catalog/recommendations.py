@@ -0,0 +1,120 @@
+"""
+"Readers also borrowed" recommendations from a precomputed co-occurrence index.
+
+Two books co-occur when the same borrower has had both on loan. The counts
+form a sparse book x book matrix that is only ever held per row: each row is
+pruned to its top N entries and stored as BookNeighbor rows, so the detail
+page needs a single indexed query.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from catalog.models import BookInstance, BookNeighbor, LoanEvent, RecommendationState
+
+TOP_N = getattr(settings, 'CATALOG_RECOMMENDATIONS', 5)
+# borrowers with more books than this (e.g. staff test accounts) say little about
+# what goes together and would add len(books)**2 to the counting
+MAX_BORROWER_BOOKS = getattr(settings, 'CATALOG_RECOMMENDATIONS_MAX_BORROWER_BOOKS', 500)
+
+def _chunks(ids, size=500):
+    ids = sorted(ids)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+def borrowed_books(borrower_ids=None, book_ids=None):
+    """Map each borrower to the set of books they have had on loan, from the loan log and current loans."""
+    checkouts = LoanEvent.objects.filter(kind=LoanEvent.CHECKOUT, borrower__isnull=False, book__isnull=False)
+    on_loan = BookInstance.objects.filter(borrower__isnull=False, book__isnull=False)
+    # id lists are split up to stay under the database's query parameter limit
+    if borrower_ids is not None:
+        lookups = [{'borrower_id__in': chunk} for chunk in _chunks(borrower_ids)]
+    elif book_ids is not None:
+        lookups = [{'book_id__in': chunk} for chunk in _chunks(book_ids)]
+    else:
+        lookups = [{}]
+
+    baskets = defaultdict(set)
+    for lookup in lookups:
+        for queryset in (checkouts.filter(**lookup), on_loan.filter(**lookup)):
+            for borrower_id, book_id in queryset.order_by().values_list('borrower_id', 'book_id').distinct().iterator():
+                baskets[borrower_id].add(book_id)
+    return baskets
+
+def co_occurrence(baskets, book_ids=None):
+    """
+    Count co-occurrences for each book (or just the given books) from the borrowers' baskets.
+
+    Each basket updates a book's whole row at once with Counter.update instead
+    of looping over book pairs in Python.
+    """
+    rows = defaultdict(Counter)
+    for basket in baskets.values():
+        if len(basket) < 2 or len(basket) > MAX_BORROWER_BOOKS:
+            continue
+        for book_id in basket if book_ids is None else basket & book_ids:
+            rows[book_id].update(basket)
+    for book_id, row in rows.items():
+        del row[book_id]
+    return rows
+
+def top_neighbors(row, n):
+    # ties go to the lower book id so rebuilds are stable
+    return heapq.nlargest(n, row.items(), key=lambda item: (item[1], -item[0]))
+
+def _neighbors(book_ids, rows):
+    return [
+        BookNeighbor(book_id=book_id, neighbor_id=neighbor_id, score=score, rank=rank)
+        for book_id in book_ids
+        for rank, (neighbor_id, score) in enumerate(top_neighbors(rows.get(book_id, {}), TOP_N), 1)
+    ]
+
+def store_neighbors(book_ids, rows):
+    """Replace the stored neighbors of book_ids with the top N of their co-occurrence rows."""
+    with transaction.atomic():
+        for chunk in _chunks(book_ids):
+            BookNeighbor.objects.filter(book_id__in=chunk).delete()
+        BookNeighbor.objects.bulk_create(_neighbors(book_ids, rows))
+
+def rebuild_neighbors():
+    """Recompute the neighbors of every book. Returns how many books have neighbors."""
+    state, _ = RecommendationState.objects.get_or_create(pk=1)
+    last_event_id = LoanEvent.objects.aggregate(last=Max('pk'))['last']
+
+    rows = co_occurrence(borrowed_books())
+    with transaction.atomic():
+        BookNeighbor.objects.all().delete()
+        BookNeighbor.objects.bulk_create(_neighbors(list(rows), rows))
+        state.last_event_id = last_event_id or 0
+        state.save()
+    return len(rows)
+
+def update_neighbors():
+    """
+    Fold checkouts logged since the last run into the neighbors.
+
+    A new loan changes the rows of every book its borrower has had, so only
+    those rows are recounted, from the baskets of everyone who borrowed them.
+    Returns how many books were recounted.
+    """
+    state, _ = RecommendationState.objects.get_or_create(pk=1)
+    new_events = LoanEvent.objects.filter(pk__gt=state.last_event_id)
+    last_event_id = new_events.aggregate(last=Max('pk'))['last']
+    if last_event_id is None:
+        return 0
+    new_checkouts = new_events.filter(pk__lte=last_event_id, kind=LoanEvent.CHECKOUT, borrower__isnull=False)
+    borrower_ids = set(new_checkouts.order_by().values_list('borrower_id', flat=True).distinct())
+
+    affected = set()
+    for basket in borrowed_books(borrower_ids).values():
+        affected |= basket
+    co_borrower_ids = set(borrowed_books(book_ids=affected))
+    rows = co_occurrence(borrowed_books(co_borrower_ids), affected)
+
+    with transaction.atomic():
+        store_neighbors(list(affected), rows)
+        state.last_event_id = last_event_id
+        state.save()
+    return len(affected)
@@ -0,0 +1,130 @@
+"""
+Daily loan rollups built from the LoanEvent log.
+
+Reports read the small DailyBookLoans / DailyGenreLoans / DailyLanguageLoans
+tables instead of scanning raw events. update_rollups() folds in new events
+incrementally; backfill_rollups() rebuilds a date range, computing date
+partitions in a process pool.
+"""
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from catalog.models import DailyBookLoans, DailyGenreLoans, DailyLanguageLoans, LoanEvent, LoanRollupState
+
+# rollup model -> the LoanEvent path it groups by
+DIMENSIONS = (
+    (DailyBookLoans, 'book'),
+    (DailyGenreLoans, 'book__genre'),
+    (DailyLanguageLoans, 'book__language'),
+)
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+def compute_rollups(first_day, last_day):
+    """
+    Sum the loan events of first_day..last_day (inclusive) per day and dimension.
+
+    Returns plain tuples so the result can cross a process boundary:
+    {rollup model name: [(day, key id, checkouts, returns, renewals), ...]}
+    """
+    events = LoanEvent.objects.filter(created__gte=_day_start(first_day), created__lt=_day_start(last_day + datetime.timedelta(days=1)))
+    rows = {}
+    for model, path in DIMENSIONS:
+        grouped = (events.exclude(**{f'{path}__isnull': True})
+                   .annotate(day=TruncDate('created'))
+                   .order_by()
+                   .values('day', path)
+                   .annotate(
+                       checkouts=Count('pk', filter=Q(kind=LoanEvent.CHECKOUT)),
+                       returns=Count('pk', filter=Q(kind=LoanEvent.RETURN)),
+                       renewals=Count('pk', filter=Q(kind=LoanEvent.RENEWAL)),
+                   )
+                   .values_list('day', path, 'checkouts', 'returns', 'renewals'))
+        rows[model.__name__] = list(grouped)
+    return rows
+
+def write_rollups(days, rows):
+    """Replace the rollups of the given days with the computed rows."""
+    with transaction.atomic():
+        for model, path in DIMENSIONS:
+            key = model._meta.get_field(path.split('__')[-1]).attname
+            model.objects.filter(day__in=days).delete()
+            model.objects.bulk_create(
+                model(day=day, checkouts=checkouts, returns=returns, renewals=renewals, **{key: key_id})
+                for day, key_id, checkouts, returns, renewals in rows[model.__name__]
+            )
+
+def update_rollups():
+    """
+    Fold loan events logged since the last run into the daily rollups.
+
+    Every day touched by a new event is recomputed from scratch, which keeps
+    the job idempotent. Today is always recomputed too, so an event whose
+    transaction committed after a later event's still gets counted.
+    Returns the days that were rebuilt.
+    """
+    state, _ = LoanRollupState.objects.get_or_create(pk=1)
+    new_events = LoanEvent.objects.filter(pk__gt=state.last_event_id)
+    last_event_id = new_events.aggregate(last=Max('pk'))['last']
+    if last_event_id is None:
+        last_event_id = state.last_event_id
+
+    days = set(new_events.annotate(day=TruncDate('created')).order_by().values_list('day', flat=True).distinct())
+    days.add(timezone.localdate())
+    for day in sorted(days):
+        write_rollups([day], compute_rollups(day, day))
+
+    state.last_event_id = last_event_id
+    state.save()
+    return sorted(days)
+
+def _date_partitions(first_day, last_day, partition_days):
+    start = first_day
+    while start <= last_day:
+        end = min(start + datetime.timedelta(days=partition_days - 1), last_day)
+        yield start, end
+        start = end + datetime.timedelta(days=1)
+
+def _compute_partition(partition):
+    return partition, compute_rollups(*partition)
+
+def backfill_rollups(first_day, last_day, processes=1, partition_days=7):
+    """
+    Rebuild the rollups of first_day..last_day.
+
+    Each date partition is aggregated in a worker process (the queries are the
+    expensive part) and the parent writes the results, so the database only
+    ever sees one writer. Returns the number of partitions rebuilt.
+    """
+    partitions = list(_date_partitions(first_day, last_day, partition_days))
+    if processes > 1:
+        # forked workers must not share the parent's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(processes, initializer=django.setup) as pool:
+            results = list(pool.map(_compute_partition, partitions))
+    else:
+        results = [_compute_partition(partition) for partition in partitions]
+
+    for (start, end), rows in results:
+        days = [day for day, _ in _date_partitions(start, end, 1)]
+        write_rollups(days, rows)
+    return len(partitions)
+
+def most_borrowed(first_day, last_day, limit=10):
+    """The most checked out books, genres and languages over a period, read from the rollups."""
+    report = {}
+    for model, key, label in ((DailyBookLoans, 'book', 'book__title'), (DailyGenreLoans, 'genre', 'genre__name'), (DailyLanguageLoans, 'language', 'language__name')):
+        report[model.__name__] = list(
+            model.objects.filter(day__gte=first_day, day__lte=last_day)
+            .values(key)
+            .annotate(name=F(label), checkouts=Sum('checkouts'), renewals=Sum('renewals'))
+            .order_by('-checkouts', 'name')[:limit]
+        )
+    return report
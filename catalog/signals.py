@@ -0,0 +1,203 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models import SET_NULL
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from catalog import authors, branches, changelog
+from catalog.backends import forget_all_permissions, forget_permissions
+from catalog.caching import bump_catalog_version
+from catalog.models import Author, Book, BookInstance, Change, Genre, Language, LoanEvent
+
+# Author.book_count and Author.copy_count are denormalized counters so the
+# author pages never have to COUNT Book or BookInstance rows (see
+# catalog.authors). These handlers keep them in step with book and copy saves
+# and deletes.
+
+@receiver(post_init, sender=Book)
+def remember_book_author(sender, instance, **kwargs):
+    # read from __dict__ so a deferred author field doesn't trigger a query
+    instance._loaded_author_id = instance.__dict__.get('author_id')
+
+@receiver(post_save, sender=Book)
+def update_author_book_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        authors.adjust_counts(instance.author_id, books=1)
+    elif 'author_id' not in instance.__dict__:
+        return
+    elif instance._loaded_author_id != instance.author_id:
+        # the book's copies move to the new author with it
+        copies = instance.bookinstance_set.count()
+        authors.adjust_counts(instance._loaded_author_id, books=-1, copies=-copies)
+        authors.adjust_counts(instance.author_id, books=1, copies=copies)
+    instance._loaded_author_id = instance.author_id
+
+@receiver(pre_delete, sender=Book)
+def count_copies_before_delete(sender, instance, **kwargs):
+    # the copies are detached from the book (SET_NULL) before post_delete, without signals
+    instance._deleted_copies = instance.bookinstance_set.count()
+
+@receiver(post_delete, sender=Book)
+def update_author_book_count_on_delete(sender, instance, **kwargs):
+    authors.adjust_counts(instance.author_id, books=-1, copies=-getattr(instance, '_deleted_copies', 0))
+
+@receiver(post_init, sender=BookInstance)
+def remember_copy_book(sender, instance, **kwargs):
+    instance._loaded_book_id = instance.__dict__.get('book_id')
+
+@receiver(post_save, sender=BookInstance)
+def update_author_copy_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw or not created and 'book_id' not in instance.__dict__:
+        return
+    if created:
+        authors.adjust_copy_count(instance.book_id, 1)
+    elif instance._loaded_book_id != instance.book_id:
+        authors.adjust_copy_count(instance._loaded_book_id, -1)
+        authors.adjust_copy_count(instance.book_id, 1)
+    instance._loaded_book_id = instance.book_id
+
+@receiver(post_delete, sender=BookInstance)
+def update_author_copy_count_on_delete(sender, instance, **kwargs):
+    authors.adjust_copy_count(instance.book_id, -1)
+
+# any edit to the data shown in the book list invalidates the cached facet counts
+def invalidate_catalog_cache(sender, **kwargs):
+    if not kwargs.get('raw', False):
+        bump_catalog_version()
+
+for model in (Book, Author, Genre, Language):
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'invalidate_catalog_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'invalidate_catalog_cache_delete_{model.__name__}')
+m2m_changed.connect(invalidate_catalog_cache, sender=Book.genre.through, dispatch_uid='invalidate_catalog_cache_genre')
+
+# Every change of a copy's loan state is appended to the LoanEvent log, which
+# the daily rollups in catalog.reports are built from. The loaded state is
+# remembered so a save can be compared with what was there before.
+
+LOAN_FIELDS = ('status', 'borrower_id', 'due_back')
+
+@receiver(post_init, sender=BookInstance)
+def remember_loan_state(sender, instance, **kwargs):
+    instance._loaded_loan_state = {field: instance.__dict__.get(field) for field in LOAN_FIELDS if field in instance.__dict__}
+
+def loan_events(instance, before, created):
+    """LoanEvents for a copy whose loan fields went from before to their current values."""
+    was_on_loan = not created and before.get('status') == 'o'
+    is_on_loan = instance.status == 'o'
+    events = []
+    if was_on_loan and (not is_on_loan or before['borrower_id'] != instance.borrower_id):
+        events.append(LoanEvent(copy_id=instance.pk, book_id=instance.book_id, borrower_id=before['borrower_id'], kind=LoanEvent.RETURN))
+    if is_on_loan and (not was_on_loan or before['borrower_id'] != instance.borrower_id):
+        events.append(LoanEvent(copy_id=instance.pk, book_id=instance.book_id, borrower_id=instance.borrower_id, kind=LoanEvent.CHECKOUT, due_back=instance.due_back))
+    elif was_on_loan and is_on_loan and before['due_back'] != instance.due_back:
+        events.append(LoanEvent(copy_id=instance.pk, book_id=instance.book_id, borrower_id=instance.borrower_id, kind=LoanEvent.RENEWAL, due_back=instance.due_back))
+    return events
+
+@receiver(post_save, sender=BookInstance)
+def record_loan_events(sender, instance, created, raw=False, **kwargs):
+    before = instance._loaded_loan_state
+    # a partially loaded copy can't be compared with what it was
+    if raw or not created and len(before) < len(LOAN_FIELDS):
+        return
+    events = loan_events(instance, before, created)
+    if events:
+        LoanEvent.objects.bulk_create(events)
+    instance._loaded_loan_state = {field: getattr(instance, field) for field in LOAN_FIELDS}
+
+# BranchStock counts the copies each branch holds; a copy counts towards the
+# (branch, book) it was loaded with until it is saved with different ones.
+
+@receiver(post_init, sender=BookInstance)
+def remember_stock_key(sender, instance, **kwargs):
+    state = instance.__dict__
+    if all(field in state for field in ('branch_id', 'book_id', 'status')):
+        instance._loaded_stock_key = branches.stock_key(state['branch_id'], state['book_id'], state['status'])
+    else:
+        instance._loaded_stock_key = None
+
+@receiver(post_save, sender=BookInstance)
+def update_branch_stock_on_save(sender, instance, created, raw=False, **kwargs):
+    # a partially loaded copy can't be compared with what it was
+    if raw or not created and not all(field in instance.__dict__ for field in ('branch_id', 'book_id', 'status')):
+        return
+    after = branches.stock_key(instance.branch_id, instance.book_id, instance.status)
+    changes = branches.stock_changes()
+    branches.add_stock_change(changes, None if created else instance._loaded_stock_key, after)
+    branches.apply_stock_changes(changes)
+    instance._loaded_stock_key = after
+
+@receiver(post_delete, sender=BookInstance)
+def update_branch_stock_on_delete(sender, instance, **kwargs):
+    changes = branches.stock_changes()
+    branches.add_stock_change(changes, branches.stock_key(instance.branch_id, instance.book_id, instance.status), None)
+    branches.apply_stock_changes(changes)
+
+# Cached permission sets (catalog.backends) are dropped when a user's groups or
+# permissions change, and all of them when a group or permission changes.
+
+def invalidate_user_permissions(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # a group or permission was given to or taken from some users
+        forget_all_permissions()
+    else:
+        forget_permissions(instance.pk)
+
+m2m_changed.connect(invalidate_user_permissions, sender=User.groups.through, dispatch_uid='invalidate_user_permissions_groups')
+m2m_changed.connect(invalidate_user_permissions, sender=User.user_permissions.through, dispatch_uid='invalidate_user_permissions_permissions')
+
+def invalidate_all_permissions(sender, **kwargs):
+    if kwargs.get('raw', False) or not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    forget_all_permissions()
+
+m2m_changed.connect(invalidate_all_permissions, sender=Group.permissions.through, dispatch_uid='invalidate_all_permissions_group')
+for model in (Group, Permission):
+    post_save.connect(invalidate_all_permissions, sender=model, dispatch_uid=f'invalidate_all_permissions_save_{model.__name__}')
+    post_delete.connect(invalidate_all_permissions, sender=model, dispatch_uid=f'invalidate_all_permissions_delete_{model.__name__}')
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_saved_user_permissions(sender, instance, **kwargs):
+    # is_active and is_superuser change what a user may do, and pks can be reused
+    forget_permissions(instance.pk)
+
+# Catalog edits are appended to the change log that downstream systems sync from, see catalog.changelog.
+
+def log_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        changelog.record(instance, Change.CREATE if created else Change.UPDATE, update_fields)
+
+def log_delete(sender, instance, **kwargs):
+    changelog.record(instance, Change.DELETE)
+
+LOGGED_MODELS = (Book, Author, Genre, Language, BookInstance)
+
+for model in LOGGED_MODELS:
+    post_save.connect(log_save, sender=model, dispatch_uid=f'log_change_save_{model.__name__}')
+    post_delete.connect(log_delete, sender=model, dispatch_uid=f'log_change_delete_{model.__name__}')
+
+def log_nulled_references(sender, instance, **kwargs):
+    # SET_NULL is applied with an UPDATE that sends no signals, in the delete's transaction, after pre_delete
+    for relation in sender._meta.related_objects:
+        if relation.on_delete is SET_NULL and relation.related_model in LOGGED_MODELS:
+            field = relation.field
+            pks = relation.related_model._base_manager.filter(**{field.attname: instance.pk}).values_list('pk', flat=True)
+            changelog.record_updates(relation.related_model, list(pks), {field.attname: None})
+
+for model in (Author, Language, Book, User):
+    pre_delete.connect(log_nulled_references, sender=model, dispatch_uid=f'log_nulled_references_{model.__name__}')
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def log_genre_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # the links are gone by post_clear, so note which ones there were
+        links = sender.objects.filter(**{'genre_id' if reverse else 'book_id': instance.pk})
+        instance._cleared_genre_links = list(links.values_list('book_id', 'genre_id'))
+    elif action == 'post_clear':
+        changelog.record_genre_links(Change.DELETE, instance._cleared_genre_links)
+    elif action in ('post_add', 'post_remove'):
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in sorted(pk_set)]
+        changelog.record_genre_links(Change.CREATE if action == 'post_add' else Change.DELETE, pairs)
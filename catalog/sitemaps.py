@@ -0,0 +1,32 @@
+from django.contrib.sitemaps import Sitemap
+from django.urls import reverse
+
+from catalog.models import Author, Book
+
+class BookSitemap(Sitemap):
+    changefreq = 'weekly'
+
+    def items(self):
+        return Book.objects.only('id').order_by('pk')
+
+class AuthorSitemap(Sitemap):
+    changefreq = 'weekly'
+
+    def items(self):
+        return Author.objects.only('id').order_by('pk')
+
+class CatalogSitemap(Sitemap):
+    changefreq = 'daily'
+    priority = 0.8
+
+    def items(self):
+        return ['index', 'books', 'authors']
+
+    def location(self, item):
+        return reverse(item)
+
+sitemaps = {
+    'catalog': CatalogSitemap,
+    'books': BookSitemap,
+    'authors': AuthorSitemap,
+}
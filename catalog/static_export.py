@@ -0,0 +1,158 @@
+"""
+Pre-render the public catalog pages to files a CDN or WhiteNoise can serve.
+
+Every page gets a fingerprint: a hash of exactly the data it displays,
+gathered for all pages with a handful of bulk queries. A page is only
+rendered again when its fingerprint changes, so an incremental build after a
+few edits touches a few files. Rendering itself can be spread over a
+process pool.
+"""
+import hashlib
+import json
+import math
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import QueryDict
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from catalog import facets
+from catalog.models import Author, Book, BookInstance, BookNeighbor, Language
+from catalog.views import AUTHOR_BOOKS_PAGE_SIZE, AuthorListView, BookListView
+
+MANIFEST = 'manifest.json'
+
+def _hash(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode()).hexdigest()
+
+def _list_pages(route, route_page, rows, page_size, extra=None):
+    """Fingerprints of each page of a paginated list view; page 1 lives at the unpaginated url."""
+    num_pages = max(1, math.ceil(len(rows) / page_size))
+    pages = {}
+    for number in range(1, num_pages + 1):
+        path = reverse(route) if number == 1 else reverse(route_page, kwargs={'page': number})
+        pages[path] = _hash(rows[(number - 1) * page_size:number * page_size], num_pages, extra)
+    return pages
+
+def page_fingerprints():
+    """Map the path of every public catalog page to the fingerprint of what it shows."""
+    authors = {pk: (first, last, born, died, count) for pk, first, last, born, died, count in
+               Author.objects.values_list('pk', 'first_name', 'last_name', 'date_of_birth', 'date_of_death', 'book_count')}
+    languages = dict(Language.objects.values_list('pk', 'name'))
+    books = {pk: row for pk, *row in Book.objects.values_list('pk', 'title', 'summary', 'isbn', 'author_id', 'language_id')}
+
+    genres = defaultdict(list)
+    for book_id, name in Book.genre.through.objects.order_by('genre__name').values_list('book_id', 'genre__name'):
+        genres[book_id].append(name)
+    copies = defaultdict(list)
+    for row in BookInstance.objects.order_by('due_back', 'pk').values_list('book_id', 'pk', 'status', 'due_back', 'imprint', 'branch__name'):
+        copies[row[0]].append(row[1:])
+    neighbors = defaultdict(list)
+    for book_id, neighbor_id in BookNeighbor.objects.order_by('rank').values_list('book_id', 'neighbor_id'):
+        neighbors[book_id].append((neighbor_id, books[neighbor_id][0]))
+    books_by_author = defaultdict(list)
+    for pk, (title, summary, isbn, author_id, language_id) in sorted(books.items(), key=lambda item: (item[1][0], item[0])):
+        books_by_author[author_id].append((pk, title))
+
+    pages = {}
+    for pk, (title, summary, isbn, author_id, language_id) in books.items():
+        pages[reverse('book-detail', args=[str(pk)])] = _hash(
+            title, summary, isbn, authors.get(author_id, ())[:2], languages.get(language_id),
+            genres[pk], copies[pk], neighbors[pk],
+        )
+    for pk, author in authors.items():
+        pages[reverse('author-detail', args=[str(pk)])] = _hash(author, books_by_author[pk][:AUTHOR_BOOKS_PAGE_SIZE + 1])
+
+    book_rows = list(BookListView.queryset.values_list('pk', 'title'))
+    # the facet counts are shown on every page of the book list
+    facet_counts = facets.facet_counts(facets.parse_filters(QueryDict()))
+    pages.update(_list_pages('books', 'books-page', book_rows, BookListView.paginate_by, facet_counts))
+    # the author list also shows each author's copy count
+    author_rows = list(AuthorListView.queryset.values_list('pk', 'copy_count'))
+    author_rows = [(pk, authors[pk], copies) for pk, copies in author_rows]
+    pages.update(_list_pages('authors', 'authors-page', author_rows, AuthorListView.paginate_by))
+
+    pages[reverse('django.contrib.sitemaps.views.sitemap')] = _hash(sorted(pages))
+    return pages
+
+def output_file(output_dir, path):
+    """File a page is written to: urls ending in an extension as is, others as <path>/index.html."""
+    relative = path.strip('/')
+    if not os.path.splitext(relative)[1]:
+        relative = os.path.join(relative, 'index.html')
+    return os.path.join(output_dir, relative)
+
+def render_pages(output_dir, paths, host, secure=True):
+    """Render paths as an anonymous visitor would see them. Returns {path: etag}."""
+    factory = RequestFactory()
+    etags = {}
+    for path in paths:
+        request = factory.get(path, secure=secure, HTTP_HOST=host)
+        request.user = AnonymousUser()
+        match = resolve(path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+
+        filename = output_file(output_dir, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as f:
+            f.write(response.content)
+        etags[path] = '"%s"' % hashlib.sha1(response.content).hexdigest()
+    return etags
+
+def _render_chunk(args):
+    return render_pages(*args)
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def build(output_dir, host, secure=True, jobs=1, full=False):
+    """
+    Render the pages whose fingerprint changed since the last build (all pages if full).
+
+    Writes manifest.json with every page's fingerprint and ETag, and removes the
+    files of pages that no longer exist. Returns (rendered, removed) path lists.
+    """
+    manifest = {} if full else load_manifest(output_dir)
+    fingerprints = page_fingerprints()
+    stale = sorted(
+        path for path, fingerprint in fingerprints.items()
+        if manifest.get(path, {}).get('fingerprint') != fingerprint or not os.path.exists(output_file(output_dir, path))
+    )
+
+    etags = {}
+    if jobs > 1 and len(stale) > jobs:
+        chunks = [stale[i::jobs] for i in range(jobs)]
+        # forked workers must not share the parent's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(jobs, initializer=django.setup) as pool:
+            for chunk_etags in pool.map(_render_chunk, [(output_dir, chunk, host, secure) for chunk in chunks]):
+                etags.update(chunk_etags)
+    else:
+        etags = render_pages(output_dir, stale, host, secure)
+
+    removed = sorted(set(manifest) - set(fingerprints))
+    for path in removed:
+        try:
+            os.remove(output_file(output_dir, path))
+        except FileNotFoundError:
+            pass
+
+    new_manifest = {
+        path: {'fingerprint': fingerprint, 'etag': etags.get(path) or manifest[path]['etag']}
+        for path, fingerprint in fingerprints.items()
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(new_manifest, f, indent=1, sort_keys=True)
+    return stale, removed
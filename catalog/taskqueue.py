@@ -0,0 +1,165 @@
+"""
+A small task queue stored in the project database.
+
+Functions decorated with @task can be queued with ``func.delay(*args, **kwargs)``
+and are run by ``manage.py run_worker``. Arguments must be JSON serializable.
+"""
+import datetime
+import json
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from catalog.models import Task
+
+# seconds before the first retry; doubled for every further attempt
+RETRY_DELAY = getattr(settings, 'TASK_RETRY_DELAY', 30)
+# a task whose lock hasn't been refreshed for this many seconds is assumed to have lost its worker
+STALE_AFTER = getattr(settings, 'TASK_STALE_AFTER', 600)
+# seconds between refreshes of a running task's lock, well inside STALE_AFTER
+HEARTBEAT = getattr(settings, 'TASK_HEARTBEAT', STALE_AFTER / 4)
+
+registry = {}
+
+class UnknownTask(Exception):
+    pass
+
+class LostLock(Exception):
+    """Raised by run() when the task was requeued, and maybe claimed by another worker, while it ran."""
+
+def task(func=None, *, name=None, max_attempts=3):
+    """Register a function as a task that can be queued with func.delay()."""
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = func
+        func.task_name = task_name
+        func.delay = lambda *args, **kwargs: enqueue(task_name, args, kwargs, max_attempts=max_attempts)
+        return func
+    return register(func) if func else register
+
+def autodiscover():
+    """Import the tasks module of every installed app so their tasks are registered."""
+    autodiscover_modules('tasks')
+
+def enqueue(name, args=(), kwargs=None, max_attempts=3, run_after=None):
+    arguments = json.dumps({'args': list(args), 'kwargs': kwargs or {}}, cls=DjangoJSONEncoder)
+    return Task.objects.create(name=name, arguments=arguments, max_attempts=max_attempts, run_after=run_after or timezone.now())
+
+def claim(worker_id):
+    """Take the oldest due task off the queue, or return None if there isn't one."""
+    now = timezone.now()
+    due = Task.objects.filter(status=Task.QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            claimed = due.select_for_update(skip_locked=True).first()
+            if claimed is None:
+                return None
+            Task.objects.filter(pk=claimed.pk).update(status=Task.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1)
+    else:
+        # no row locks (SQLite): the conditional UPDATE only succeeds for the
+        # worker that still sees the task queued, so it works as a compare-and-swap
+        for pk in due.values_list('pk', flat=True)[:10]:
+            if Task.objects.filter(pk=pk, status=Task.QUEUED).update(status=Task.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1):
+                claimed = Task(pk=pk)
+                break
+        else:
+            return None
+
+    return Task.objects.get(pk=claimed.pk)
+
+def heartbeat(claimed, stopped):
+    """Refresh a running task's lock every HEARTBEAT seconds until stopped, so a long run isn't taken for a lost one."""
+    try:
+        while not stopped.wait(HEARTBEAT):
+            try:
+                Task.objects.filter(pk=claimed.pk, status=Task.RUNNING, locked_by=claimed.locked_by).update(locked_at=timezone.now())
+            except DatabaseError:
+                # the next beat tries again; the lock only goes stale after several misses
+                pass
+    finally:
+        # the thread's own connection
+        connection.close()
+
+def run(claimed):
+    """Run a claimed task, then mark it done or schedule a retry with exponential backoff."""
+    start = time.perf_counter()
+    stopped = threading.Event()
+    beating = threading.Thread(target=heartbeat, args=(claimed, stopped), daemon=True)
+    beating.start()
+    try:
+        func = registry.get(claimed.name)
+        if func is None:
+            raise UnknownTask(claimed.name)
+        arguments = json.loads(claimed.arguments)
+        func(*arguments['args'], **arguments['kwargs'])
+    except Exception:
+        claimed.last_error = traceback.format_exc()
+        if claimed.attempts < claimed.max_attempts:
+            claimed.status = Task.QUEUED
+            claimed.run_after = timezone.now() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (claimed.attempts - 1))
+        else:
+            claimed.status = Task.FAILED
+            claimed.finished = timezone.now()
+    else:
+        claimed.status = Task.DONE
+        claimed.finished = timezone.now()
+    finally:
+        stopped.set()
+        beating.join()
+    claimed.duration = time.perf_counter() - start
+    # only while this claim still holds the task: requeue_stale() may have handed it to another worker meanwhile
+    held = Task.objects.filter(pk=claimed.pk, status=Task.RUNNING, locked_by=claimed.locked_by, attempts=claimed.attempts)
+    if not held.update(status=claimed.status, run_after=claimed.run_after, finished=claimed.finished, duration=claimed.duration,
+                       locked_by='', locked_at=None, last_error=claimed.last_error):
+        raise LostLock(f'{claimed.name} #{claimed.pk} was requeued while {claimed.locked_by} ran it')
+    claimed.locked_by = ''
+    claimed.locked_at = None
+    return claimed
+
+def requeue_stale():
+    """
+    Put tasks whose worker died mid-run back on the queue, or mark them failed
+    if that was their last attempt. Returns how many were requeued and failed.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - datetime.timedelta(seconds=STALE_AFTER))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished=now, locked_by='', locked_at=None, last_error='The worker running the task was lost.')
+    requeued = stale.update(status=Task.QUEUED, locked_by='', locked_at=None)
+    return requeued, failed
+
+def run_pending(worker_id, limit=None):
+    """Run due tasks until the queue is empty or limit tasks have run. Returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        claimed = claim(worker_id)
+        if claimed is None:
+            break
+        try:
+            run(claimed)
+        except LostLock:
+            # the task's new owner records how it went
+            pass
+        ran += 1
+    return ran
+
+def task_stats():
+    """Per-task counts by status and timings of finished runs."""
+    return (Task.objects.order_by('name').values('name')
+            .annotate(
+                total=Count('pk'),
+                queued=Count('pk', filter=Q(status=Task.QUEUED)),
+                running=Count('pk', filter=Q(status=Task.RUNNING)),
+                done=Count('pk', filter=Q(status=Task.DONE)),
+                failed=Count('pk', filter=Q(status=Task.FAILED)),
+                avg_duration=Avg('duration', filter=Q(status=Task.DONE)),
+                max_duration=Max('duration', filter=Q(status=Task.DONE)),
+            ))
@@ -0,0 +1,57 @@
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from catalog import recommendations, reports
+from catalog.models import Author, Book
+from catalog.taskqueue import task
+
+@task
+def delete_book(pk):
+    """Delete a book; its copies are set to no book by the SET_NULL foreign key."""
+    book = Book.objects.filter(pk=pk).first()
+    if book is not None:
+        book.delete()
+
+@task
+def delete_author(pk):
+    """Delete an author; their books are set to no author by the SET_NULL foreign key."""
+    author = Author.objects.filter(pk=pk).first()
+    if author is not None:
+        author.delete()
+
+@task(max_attempts=5)
+def send_email(subject, body, from_email, to, html_body=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_body is not None:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
+
+@task(max_attempts=5)
+def send_password_reset(user_pk, context, subject_template_name, email_template_name, from_email, html_email_template_name=None):
+    """
+    Email a user the link to reset their password.
+
+    The link's uid and token are made here rather than queued with the task,
+    so they're never stored in Task.arguments.
+    """
+    user = User.objects.filter(pk=user_pk, is_active=True).first()
+    if user is None:
+        return
+    context = dict(context, user=user, uid=urlsafe_base64_encode(force_bytes(user.pk)).decode(),
+                   token=default_token_generator.make_token(user))
+    PasswordResetForm().send_mail(subject_template_name, email_template_name, context, from_email, context['email'],
+                                  html_email_template_name=html_email_template_name)
+
+@task
+def rollup_loans():
+    """Fold new loan events into the daily reporting rollups."""
+    reports.update_rollups()
+
+@task
+def update_recommendations():
+    """Fold new checkouts into the "readers also borrowed" neighbors."""
+    recommendations.update_neighbors()
@@ -0,0 +1,143 @@
+import datetime
+from unittest import skipUnless
+
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import authors
+from catalog.models import Author, Book, BookInstance
+
+class AuthorCountsTest(TestCase):
+    def setUp(self):
+        self.smith = Author.objects.create(first_name='John', last_name='Smith')
+        self.jones = Author.objects.create(first_name='Jane', last_name='Jones')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157', author=self.smith)
+        self.other = Book.objects.create(title='Other Title', summary='a little blurb', isbn='9781861972712', author=self.jones)
+
+    def counts(self, author):
+        return Author.objects.values_list('book_count', 'copy_count').get(pk=author.pk)
+
+    def add_copy(self, book):
+        return BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def test_copies_are_counted(self):
+        copy = self.add_copy(self.book)
+        self.add_copy(self.book)
+        self.assertEqual(self.counts(self.smith), (1, 2))
+
+        copy.book = self.other
+        copy.save()
+        self.assertEqual((self.counts(self.smith), self.counts(self.jones)), ((1, 1), (1, 1)))
+
+        copy.delete()
+        self.assertEqual(self.counts(self.jones), (1, 0))
+
+    def test_copies_move_with_their_book(self):
+        self.add_copy(self.book)
+        self.add_copy(self.book)
+        self.book.author = self.jones
+        self.book.save()
+        self.assertEqual((self.counts(self.smith), self.counts(self.jones)), ((0, 0), (2, 2)))
+
+    def test_deleting_a_book_uncounts_its_copies(self):
+        self.add_copy(self.book)
+        self.book.delete()
+        self.assertEqual(self.counts(self.smith), (0, 0))
+
+    def test_rebuild_counts(self):
+        self.add_copy(self.book)
+        Author.objects.update(book_count=7, copy_count=7)
+        self.assertEqual(authors.rebuild_counts(), 2)
+        self.assertEqual((self.counts(self.smith), self.counts(self.jones)), ((1, 1), (1, 0)))
+
+    def test_initial_follows_last_name(self):
+        self.assertEqual(self.smith.initial, 'S')
+        Author.objects.bulk_create([Author(first_name='Ann', last_name='de Vries')])
+        self.assertEqual(Author.objects.get(last_name='de Vries').initial, 'D')
+
+        self.smith.last_name = 'Brown'
+        self.smith.save_changes(['last_name'])
+        self.assertEqual(Author.objects.get(pk=self.smith.pk).initial, 'B')
+
+class AuthorListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rows = [
+            # last name, born, died, books, copies
+            ('Smith', datetime.date(1950, 1, 1), None, 3, 1),
+            ('Smythe', datetime.date(1900, 1, 1), datetime.date(1970, 1, 1), 1, 5),
+            ('smedley', None, None, 2, 0),
+            ('Jones', datetime.date(1920, 1, 1), datetime.date(1990, 1, 1), 0, 0),
+        ]
+        for last_name, born, died, books, copies in rows:
+            Author.objects.create(first_name='A', last_name=last_name, date_of_birth=born, date_of_death=died,
+                                  book_count=books, copy_count=copies)
+
+    def names(self, query=''):
+        response = self.client.get(reverse('authors') + query)
+        return [author.last_name for author in response.context['author_list']]
+
+    def test_default_is_by_name(self):
+        self.assertEqual(self.names(), ['Jones', 'Smith', 'Smythe', 'smedley'])
+
+    def test_sorts(self):
+        self.assertEqual(self.names('?sort=books'), ['Smith', 'smedley', 'Smythe', 'Jones'])
+        self.assertEqual(self.names('?sort=copies'), ['Smythe', 'Smith', 'Jones', 'smedley'])
+        # only the authors with a known birth date, as the option says
+        self.assertEqual(self.names('?sort=born'), ['Smythe', 'Jones', 'Smith'])
+        self.assertContains(self.client.get(reverse('authors')), 'Date of birth (known only)')
+
+    def test_name_prefix(self):
+        self.assertEqual(self.names('?prefix=s'), ['Smith', 'Smythe', 'smedley'])
+        self.assertEqual(self.names('?prefix=Smi'), ['Smith'])
+        self.assertEqual(self.names('?prefix=smy&sort=books'), ['Smythe'])
+        self.assertEqual(self.names('?prefix=Q'), [])
+
+    def test_name_prefix_in_either_case(self):
+        Author.objects.create(first_name='Charles', last_name='de Gaulle')
+        for prefix in ('d', 'de', 'De', 'DE g', 'de gaulle'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.names(f'?prefix={prefix}'), ['de Gaulle'])
+        self.assertEqual(self.names('?prefix=SMITH'), ['Smith'])
+        self.assertEqual(self.names('?prefix=sm&sort=copies'), ['Smythe', 'Smith', 'smedley'])
+
+    def test_name_key_follows_last_name(self):
+        author = Author.objects.create(first_name='Johann', last_name='Strauß')
+        self.assertEqual(Author.objects.get(pk=author.pk).name_key, 'STRAUSS')
+        author.last_name = 'Lehár'
+        author.save_changes(['last_name'])
+        self.assertEqual(Author.objects.get(pk=author.pk).name_key, 'LEHÁR')
+        self.assertEqual(self.names('?prefix=lehá'), ['Lehár'])
+
+    def test_name_prefix_ending_in_the_last_code_point(self):
+        Author.objects.create(first_name='A', last_name='Sm\U0010ffff\U0010ffff')
+        Author.objects.create(first_name='A', last_name='Sn')
+        self.assertEqual(self.names('?prefix=Sm%F4%8F%BF%BF'), ['Sm\U0010ffff\U0010ffff'])
+        self.assertEqual(self.names('?prefix=%F4%8F%BF%BF%F4%8F%BF%BF'), [])
+
+    def test_status(self):
+        self.assertEqual(self.names('?status=living'), ['Smith', 'smedley'])
+        self.assertEqual(self.names('?status=deceased&sort=born'), ['Smythe', 'Jones'])
+
+    def test_unknown_options_are_ignored(self):
+        self.assertEqual(self.names('?sort=shoe_size&status=undead'), ['Jones', 'Smith', 'Smythe', 'smedley'])
+
+    def test_options_are_kept_across_pages(self):
+        for n in range(10):
+            Author.objects.create(first_name=f'B {n}', last_name=f'Scott {n}')
+        response = self.client.get(reverse('authors'), {'prefix': 's', 'sort': 'books', 'status': 'living'})
+        self.assertEqual(response.context['paginator'].count, 12)
+        self.assertContains(response, 'href="/catalog/authors/page/2/?prefix=S&amp;sort=books&amp;status=living"')
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads SQLite query plans')
+    def test_every_combination_reads_an_index(self):
+        for sort, label, ordering in authors.SORTS:
+            for prefix in ('', 'S'):
+                for status in ('', authors.LIVING, authors.DECEASED):
+                    options = authors.parse_options(QueryDict(f'sort={sort}&prefix={prefix}&status={status}'))
+                    plan = authors.filter_authors(Author.objects.all(), options)[:10].explain()
+                    with self.subTest(options=options):
+                        self.assertIn('USING INDEX', plan)
+                        self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,78 @@
+import datetime
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.backends import permissions_cache
+from catalog.models import Book, BookInstance
+
+class CachedModelBackendTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.permission = Permission.objects.get(codename='can_mark_returned')
+        cls.librarians = Group.objects.create(name='Librarians')
+
+    def setUp(self):
+        cache.clear()
+        permissions_cache().clear()
+        self.user = User.objects.create_user(username='librarian', password='p@55w0rd')
+
+    def can_mark_returned(self):
+        # a fresh user object each time, as every request loads one
+        return User.objects.get(pk=self.user.pk).has_perm('catalog.can_mark_returned')
+
+    def test_no_queries_after_the_first_lookup(self):
+        self.user.user_permissions.add(self.permission)
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_perm('catalog.can_mark_returned'))
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('catalog.can_mark_returned'))
+            self.assertTrue(user.has_module_perms('catalog'))
+
+    def test_user_permission_changes(self):
+        self.assertFalse(self.can_mark_returned())
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.can_mark_returned())
+        self.user.user_permissions.remove(self.permission)
+        self.assertFalse(self.can_mark_returned())
+        self.permission.user_set.add(self.user)
+        self.assertTrue(self.can_mark_returned())
+
+    def test_group_changes(self):
+        self.user.groups.add(self.librarians)
+        self.assertFalse(self.can_mark_returned())
+        self.librarians.permissions.add(self.permission)
+        self.assertTrue(self.can_mark_returned())
+        self.user.groups.clear()
+        self.assertFalse(self.can_mark_returned())
+        self.librarians.user_set.add(self.user)
+        self.assertTrue(self.can_mark_returned())
+        self.librarians.delete()
+        self.assertFalse(self.can_mark_returned())
+
+    def test_deactivated_users_lose_their_permissions(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.can_mark_returned())
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.can_mark_returned())
+
+    def test_permission_checks_in_views_are_cached(self):
+        self.user.user_permissions.add(self.permission)
+        book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157')
+        BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='o', borrower=self.user, due_back=datetime.date.today())
+        self.client.login(username='librarian', password='p@55w0rd')
+
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse('all-borrowed'))
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(reverse('all-borrowed'))
+        # the user and group permission queries are gone
+        self.assertEqual(len(second), len(first) - 2)
+        self.assertFalse(any('auth_permission' in query['sql'] for query in second))
@@ -0,0 +1,149 @@
+import datetime
+import json
+import uuid
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import branches, circulation
+from catalog.models import Book, BookInstance, Branch, BranchStock
+
+class BranchStockTest(TestCase):
+    def setUp(self):
+        self.central = Branch.objects.create(name='Central')
+        self.east = Branch.objects.create(name='East')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157')
+        self.reader = User.objects.create_user(username='reader', password='p@55w0rd')
+
+    def stock(self, branch):
+        stock = BranchStock.objects.filter(branch=branch, book=self.book).first()
+        return (stock.copies, stock.available) if stock else None
+
+    def test_saves_and_deletes_keep_stock_current(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a', branch=self.central)
+        BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='m', branch=self.central)
+        self.assertEqual(self.stock(self.central), (2, 1))
+
+        copy.status = 'o'
+        copy.borrower = self.reader
+        copy.save()
+        self.assertEqual(self.stock(self.central), (2, 0))
+
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'a'
+        copy.branch = self.east
+        copy.save()
+        self.assertEqual(self.stock(self.central), (1, 0))
+        self.assertEqual(self.stock(self.east), (1, 1))
+
+        copy.delete()
+        self.assertEqual(self.stock(self.east), (0, 0))
+
+    def test_copies_without_a_branch_are_not_counted(self):
+        BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+        self.assertFalse(BranchStock.objects.exists())
+
+    def test_circulation_updates_stock(self):
+        copies = [BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a', branch=self.central) for _ in range(3)]
+        circulation.scan(circulation.CHECK_OUT, [str(copy.pk) for copy in copies[:2]], borrower=self.reader)
+        self.assertEqual(self.stock(self.central), (3, 1))
+        circulation.scan(circulation.CHECK_IN, [str(copies[0].pk)])
+        self.assertEqual(self.stock(self.central), (3, 2))
+
+    def test_transfer(self):
+        available = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a', branch=self.central)
+        on_loan = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='o', borrower=self.reader, branch=self.central)
+        already = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='m', branch=self.east)
+
+        scanned = [str(available.pk), str(on_loan.pk), str(already.pk), str(available.pk), str(uuid.uuid4()), 'not-a-uuid']
+        results = branches.transfer(scanned, self.east)
+        self.assertEqual([result['outcome'] for result in results], [
+            branches.MOVED, branches.ON_LOAN, branches.ALREADY_THERE, branches.DUPLICATE, branches.NOT_FOUND, branches.INVALID,
+        ])
+        self.assertEqual(results[0]['from_branch'], self.central.pk)
+        self.assertEqual(BookInstance.objects.get(pk=available.pk).branch, self.east)
+        self.assertEqual(self.stock(self.central), (1, 0))
+        self.assertEqual(self.stock(self.east), (2, 1))
+
+    def test_rebuild_stock(self):
+        BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a', branch=self.central)
+        BranchStock.objects.update(copies=7, available=7)
+        branches.rebuild_stock()
+        self.assertEqual(self.stock(self.central), (1, 1))
+
+class BranchViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.central = Branch.objects.create(name='Central')
+        cls.east = Branch.objects.create(name='East')
+        cls.reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        cls.librarian = User.objects.create_user(username='librarian', password='p@55w0rd')
+        cls.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+
+        cls.shared = Book.objects.create(title='Held Everywhere', summary='a little blurb', isbn='9780306406157')
+        cls.central_only = Book.objects.create(title='Held Centrally', summary='a little blurb', isbn='9781861972712')
+        cls.central_copy = BookInstance.objects.create(book=cls.shared, imprint='Central Imprint', status='a', branch=cls.central)
+        cls.east_copy = BookInstance.objects.create(book=cls.shared, imprint='East Imprint', status='o', borrower=cls.reader,
+                                                    due_back=datetime.date.today(), branch=cls.east)
+        BookInstance.objects.create(book=cls.central_only, imprint='Central Imprint', status='o', borrower=cls.reader,
+                                    due_back=datetime.date.today(), branch=cls.central)
+
+    def test_branch_books(self):
+        response = self.client.get(reverse('branch-books', args=[self.central.pk]))
+        self.assertEqual([stock.book for stock in response.context['stock_list']], [self.central_only, self.shared])
+        response = self.client.get(reverse('branch-books', args=[self.east.pk]))
+        self.assertEqual([stock.book for stock in response.context['stock_list']], [self.shared])
+        self.assertContains(response, '0 of 1 available')
+
+    def test_branch_available(self):
+        response = self.client.get(reverse('branch-available', args=[self.central.pk]))
+        self.assertEqual([stock.book for stock in response.context['stock_list']], [self.shared])
+        response = self.client.get(reverse('branch-available', args=[self.east.pk]))
+        self.assertEqual(len(response.context['stock_list']), 0)
+
+    def test_unknown_branch(self):
+        response = self.client.get(reverse('branch-books', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_branch_book_detail_only_shows_the_branch_copies(self):
+        response = self.client.get(reverse('branch-book-detail', args=[self.east.pk, self.shared.pk]))
+        self.assertEqual(list(response.context['copies']), [self.east_copy])
+        self.assertContains(response, 'Copies at East')
+
+        response = self.client.get(reverse('book-detail', args=[self.shared.pk]))
+        self.assertEqual(len(response.context['copies']), 2)
+        self.assertContains(response, 'Central</a>: 1 of 1 available')
+
+    def test_branch_borrowed(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        response = self.client.get(reverse('branch-borrowed', args=[self.east.pk]))
+        self.assertEqual(list(response.context['bookinstance_list']), [self.east_copy])
+        self.assertContains(response, 'Books on loan at East')
+
+    def test_branch_borrowed_needs_permission(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        response = self.client.get(reverse('branch-borrowed', args=[self.east.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_transfer_copies(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        batch = {'branch': self.east.pk, 'copies': [str(self.central_copy.pk)]}
+        response = self.client.post(reverse('transfer-copies'), json.dumps(batch), content_type='application/json')
+        self.assertEqual(response.json()['summary'], {'moved': 1})
+        self.assertEqual(BranchStock.objects.get(branch=self.east, book=self.shared).available, 1)
+
+    def test_transfer_copies_bad_branch(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        batch = {'branch': 999, 'copies': [str(self.central_copy.pk)]}
+        response = self.client.post(reverse('transfer-copies'), json.dumps(batch), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_transfer_copies_branch_must_be_an_id(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        for branch_id in (True, 99999999999999999999999, 0):
+            batch = {'branch': branch_id, 'copies': [str(self.central_copy.pk)]}
+            response = self.client.post(reverse('transfer-copies'), json.dumps(batch), content_type='application/json')
+            with self.subTest(branch=branch_id):
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(BookInstance.objects.get(pk=self.central_copy.pk).branch_id, self.central_copy.branch_id)
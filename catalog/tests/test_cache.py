@@ -0,0 +1,91 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+
+from catalog import caching
+from catalog.models import Genre
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'locallibrary.cache.TwoTierCache',
+        'LOCATION': 'two-tier-tests',
+        'OPTIONS': {'L2': 'shared', 'L1_MAX_BYTES': 1000, 'L1_TIMEOUT': 5},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+}
+
+@override_settings(CACHES=TEST_CACHES)
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.reset_stats()
+
+    def test_reads_fill_l1_from_l2(self):
+        caches['shared'].set('catalog:genres:1', 'from another worker')
+        self.assertEqual(cache.get('catalog:genres:1'), 'from another worker')
+        caches['shared'].delete('catalog:genres:1')
+        # still in L1 until it expires there
+        self.assertEqual(cache.get('catalog:genres:1'), 'from another worker')
+        with mock.patch('locallibrary.cache.time.monotonic', return_value=time.monotonic() + 10):
+            self.assertIsNone(cache.get('catalog:genres:1'))
+        self.assertEqual(cache.stats(), {'catalog:genres': {'l2_hits': 1, 'l1_hits': 1, 'misses': 1}})
+
+    def test_writes_go_to_both_tiers(self):
+        cache.set('catalog:counts', 1)
+        self.assertEqual(caches['shared'].get('catalog:counts'), 1)
+        cache.incr('catalog:counts')
+        self.assertEqual(cache.get('catalog:counts'), 2)
+        cache.delete('catalog:counts')
+        self.assertIsNone(cache.get('catalog:counts'))
+
+    def test_l1_evicts_least_recently_used_by_size(self):
+        for n in range(5):
+            cache.set(f'big:{n}', 'x' * 300)
+        caches['shared'].clear()
+        cache.reset_stats()
+        # 1000 bytes only hold the last three values
+        self.assertEqual([cache.get(f'big:{n}') is not None for n in range(5)], [False, False, True, True, True])
+
+    def test_get_or_set_is_single_flight_within_a_process(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('catalog:facets', compute))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(cache.stats()['catalog:facets']['computed'], 1)
+
+    def test_get_or_set_waits_for_another_process(self):
+        # another worker holds the lock and publishes its result shortly
+        caches['shared'].add('catalog:facets:lock', 1)
+        timer = threading.Timer(0.1, caches['shared'].set, ['catalog:facets', 'theirs'])
+        timer.start()
+        self.assertEqual(cache.get_or_set('catalog:facets', lambda: 'ours'), 'theirs')
+        timer.join()
+
+class CatalogLookupCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_genre_names_cached_until_genres_change(self):
+        fantasy = Genre.objects.create(name='Fantasy')
+        self.assertEqual(caching.genre_names(), {fantasy.pk: 'Fantasy'})
+        with self.assertNumQueries(0):
+            caching.genre_names()
+        poetry = Genre.objects.create(name='Poetry')
+        self.assertEqual(caching.genre_names(), {fantasy.pk: 'Fantasy', poetry.pk: 'Poetry'})
@@ -0,0 +1,157 @@
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog import branches, changelog, circulation
+from catalog.models import Author, Book, BookInstance, Branch, Change, Genre
+
+def logged(**filters):
+    return [(change.model, change.object_id, change.action) for change in Change.objects.filter(**filters).order_by('id')]
+
+class ChangeLogTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157', author=self.author)
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.poetry = Genre.objects.create(name='Poetry')
+        Change.objects.all().delete()
+
+    def test_saves_and_deletes(self):
+        book = Book.objects.create(title='Another Title', summary='a little blurb', isbn='9781861972712', author=self.author)
+        book.title = 'A Better Title'
+        book.save(update_fields=['title'])
+        book_pk = book.pk
+        book.delete()
+
+        pk = str(book_pk)
+        self.assertEqual(logged(model='book'), [('book', pk, Change.CREATE), ('book', pk, Change.UPDATE), ('book', pk, Change.DELETE)])
+        create, update, delete = Change.objects.filter(model='book').order_by('id')
+        self.assertEqual(json.loads(create.data)['author_id'], self.author.pk)
+        self.assertEqual(json.loads(update.data), {'title': 'A Better Title'})
+        self.assertEqual(delete.data, '')
+
+    def test_copies(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+        self.assertEqual(logged(model='bookinstance'), [('bookinstance', str(copy.pk), Change.CREATE)])
+        self.assertEqual(json.loads(Change.objects.get(model='bookinstance').data)['status'], 'a')
+
+    def test_genre_links(self):
+        self.book.genre.add(self.fantasy, self.poetry)
+        self.book.genre.remove(self.fantasy)
+        self.fantasy.book_set.add(self.book)
+        self.book.genre.clear()
+
+        fantasy = f'{self.book.pk}:{self.fantasy.pk}'
+        poetry = f'{self.book.pk}:{self.poetry.pk}'
+        self.assertEqual(logged(model=changelog.BOOK_GENRE), [
+            ('book_genre', fantasy, Change.CREATE),
+            ('book_genre', poetry, Change.CREATE),
+            ('book_genre', fantasy, Change.DELETE),
+            ('book_genre', fantasy, Change.CREATE),
+            ('book_genre', fantasy, Change.DELETE),
+            ('book_genre', poetry, Change.DELETE),
+        ])
+
+    def test_bulk_updates_are_logged(self):
+        reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        branch = Branch.objects.create(name='East')
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+        Change.objects.all().delete()
+
+        circulation.scan(circulation.CHECK_OUT, [str(copy.pk)], borrower=reader, due_back=datetime.date(2030, 1, 1))
+        circulation.scan(circulation.CHECK_IN, [str(copy.pk)])
+        branches.transfer([str(copy.pk)], branch)
+        self.assertEqual([json.loads(change.data) for change in Change.objects.filter(model='bookinstance').order_by('id')], [
+            {'status': 'o', 'borrower_id': reader.pk, 'due_back': '2030-01-01'},
+            {'status': 'a', 'borrower_id': None, 'due_back': None},
+            {'branch_id': branch.pk},
+        ])
+
+    def test_references_set_to_null_are_logged(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+        Change.objects.all().delete()
+        author, book = str(self.author.pk), str(self.book.pk)
+
+        self.author.delete()
+        self.book.delete()
+        self.assertEqual(logged(), [
+            ('book', book, Change.UPDATE),
+            ('author', author, Change.DELETE),
+            ('bookinstance', str(copy.pk), Change.UPDATE),
+            ('book', book, Change.DELETE),
+        ])
+        self.assertEqual([json.loads(change.data) for change in Change.objects.filter(action=Change.UPDATE).order_by('id')],
+                         [{'author_id': None}, {'book_id': None}])
+
+class ChangeLogTransactionTest(TransactionTestCase):
+    def test_save_and_change_commit_together(self):
+        with mock.patch('catalog.changelog.record', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Genre.objects.create(name='Fantasy')
+        self.assertFalse(Genre.objects.exists())
+
+@mock.patch('catalog.changelog.FEED_LAG', datetime.timedelta(0))
+class ChangeFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.consumer = User.objects.create_user(username='search-index', password='p@55w0rd')
+        cls.consumer.user_permissions.add(Permission.objects.get(codename='can_read_changes'))
+        User.objects.create_user(username='reader', password='p@55w0rd')
+        for n in range(5):
+            Genre.objects.create(name=f'Genre {n}')
+
+    def feed(self, **params):
+        return self.client.get(reverse('change-feed'), params)
+
+    def test_batches_after_the_cursor(self):
+        self.client.login(username='search-index', password='p@55w0rd')
+        first = self.feed(limit=3).json()
+        self.assertEqual([change['data']['name'] for change in first['changes']], ['Genre 0', 'Genre 1', 'Genre 2'])
+        self.assertTrue(first['more'])
+
+        second = self.feed(after=first['cursor'], limit=3).json()
+        self.assertEqual([change['data']['name'] for change in second['changes']], ['Genre 3', 'Genre 4'])
+        self.assertFalse(second['more'])
+
+        third = self.feed(after=second['cursor']).json()
+        self.assertEqual((third['changes'], third['cursor']), ([], second['cursor']))
+
+    def test_recent_changes_wait_for_the_lag(self):
+        self.client.login(username='search-index', password='p@55w0rd')
+        with mock.patch('catalog.changelog.FEED_LAG', datetime.timedelta(minutes=1)):
+            self.assertEqual(self.feed().json()['changes'], [])
+
+    def test_bad_parameters(self):
+        self.client.login(username='search-index', password='p@55w0rd')
+        self.assertEqual(self.feed(after='x').status_code, 400)
+        self.assertEqual(self.feed(limit=changelog.FEED_MAX_LIMIT + 1).status_code, 400)
+
+    def test_needs_permission(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        self.assertEqual(self.feed().status_code, 302)
+
+    def test_consume_changes_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cursor_file = os.path.join(directory, 'cursor')
+
+        out = io.StringIO()
+        call_command('consume_changes', cursor_file=cursor_file, batch=2, stdout=out)
+        changes = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([change['data']['name'] for change in changes if change['model'] == 'genre'], [f'Genre {n}' for n in range(5)])
+        with open(cursor_file) as f:
+            self.assertEqual(int(f.read()), changes[-1]['id'])
+
+        Genre.objects.create(name='Poetry')
+        out = io.StringIO()
+        call_command('consume_changes', cursor_file=cursor_file, stdout=out)
+        self.assertEqual([json.loads(line)['data']['name'] for line in out.getvalue().splitlines()], ['Poetry'])
@@ -0,0 +1,70 @@
+import datetime
+import json
+import uuid
+
+from django.contrib.auth.models import User, Permission
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.models import Book, BookInstance, LoanEvent
+
+class ScanCopiesTest(TestCase):
+    def setUp(self):
+        librarian = User.objects.create_user(username='librarian', password='p@55w0rd')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        self.client.login(username='librarian', password='p@55w0rd')
+
+        book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157')
+        self.available = [BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a') for _ in range(3)]
+        self.on_loan = BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='o', borrower=self.reader, due_back=datetime.date.today())
+        self.in_maintenance = BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='m')
+        LoanEvent.objects.all().delete()
+
+    def scan(self, **batch):
+        response = self.client.post(reverse('scan-copies'), json.dumps(batch), content_type='application/json')
+        return response
+
+    def outcomes(self, response):
+        return [result['outcome'] for result in response.json()['results']]
+
+    def test_check_out(self):
+        copies = [str(copy.pk) for copy in self.available]
+        response = self.scan(action='checkout', copies=copies, borrower='reader', due_back='2030-01-01')
+        self.assertEqual(self.outcomes(response), ['checked_out'] * 3)
+        self.assertEqual(BookInstance.objects.filter(status='o', borrower=self.reader, due_back=datetime.date(2030, 1, 1)).count(), 3)
+        self.assertEqual(LoanEvent.objects.filter(kind=LoanEvent.CHECKOUT, borrower=self.reader).count(), 3)
+
+    def test_check_in(self):
+        response = self.scan(action='checkin', copies=[str(self.on_loan.pk), str(self.available[0].pk)])
+        self.assertEqual(self.outcomes(response), ['checked_in', 'not_on_loan'])
+        self.on_loan.refresh_from_db()
+        self.assertEqual((self.on_loan.status, self.on_loan.borrower), ('a', None))
+        self.assertEqual(list(LoanEvent.objects.values_list('kind', 'borrower')), [(LoanEvent.RETURN, self.reader.pk)])
+
+    def test_per_item_outcomes(self):
+        copies = ['not-a-uuid', str(uuid.uuid4()), str(self.available[0].pk), str(self.available[0].pk), str(self.in_maintenance.pk), str(self.on_loan.pk)]
+        response = self.scan(action='checkout', copies=copies, borrower='reader')
+        self.assertEqual(self.outcomes(response), ['invalid', 'not_found', 'checked_out', 'duplicate', 'not_available', 'not_available'])
+        self.assertEqual(response.json()['summary']['not_available'], 2)
+        self.assertEqual(response.json()['results'][2]['title'], 'Book Title')
+
+    def test_batch_uses_constant_number_of_queries(self):
+        copies = [str(copy.pk) for copy in self.available]
+        # session, user, two permission queries and the borrower, then a savepoint
+        # around one select, one update and the loan event and change log inserts
+        with self.assertNumQueries(11):
+            self.scan(action='checkout', copies=copies, borrower='reader')
+
+    def test_check_out_needs_known_borrower(self):
+        response = self.scan(action='checkout', copies=[str(self.available[0].pk)], borrower='nobody')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_oversized_batch(self):
+        response = self.scan(action='checkin', copies=[str(uuid.uuid4()) for _ in range(circulation.MAX_SCANS + 1)])
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_unknown_action(self):
+        response = self.scan(action='shelve', copies=[])
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,182 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.models import Author, Book, BookInstance, ConcurrentUpdate, Genre, Language
+
+class VersionedModelTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_save_changes_writes_only_the_given_fields(self):
+        author = Author.objects.get(pk=self.author.pk)
+        author.first_name = 'Jane'
+        author.last_name = 'Stale'
+        author.save_changes(['first_name'])
+
+        self.author.refresh_from_db()
+        self.assertEqual((self.author.first_name, self.author.last_name, self.author.version), ('Jane', 'Smith', 1))
+        self.assertEqual(author.version, 1)
+
+    def test_stale_version_conflicts(self):
+        first = Author.objects.get(pk=self.author.pk)
+        second = Author.objects.get(pk=self.author.pk)
+        first.first_name = 'Jane'
+        first.save_changes(['first_name'])
+
+        second.last_name = 'Jones'
+        with self.assertRaises(ConcurrentUpdate):
+            second.save_changes(['last_name'])
+        self.assertEqual(second.version, 0)
+        self.assertEqual(Author.objects.get(pk=self.author.pk).last_name, 'Smith')
+
+        # the test transaction is still usable
+        second.refresh_from_db()
+        second.last_name = 'Jones'
+        second.save_changes(['last_name'])
+        self.assertEqual(Author.objects.values_list('first_name', 'last_name', 'version').get(), ('Jane', 'Jones', 2))
+
+    def test_deleted_row_conflicts(self):
+        author = Author.objects.get(pk=self.author.pk)
+        Author.objects.filter(pk=self.author.pk).delete()
+        with self.assertRaises(ConcurrentUpdate):
+            author.save_changes(['first_name'])
+
+    def test_plain_saves_move_the_version_on(self):
+        stale = Author.objects.get(pk=self.author.pk)
+        self.author.first_name = 'Jane'
+        self.author.save()
+        self.author.save(update_fields=['first_name'])
+        self.assertEqual(self.author.version, 2)
+        with self.assertRaises(ConcurrentUpdate):
+            stale.save_changes(['last_name'])
+
+    def test_bulk_updates_move_the_version_on(self):
+        reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157', author=self.author)
+        copy = BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+        circulation.scan(circulation.CHECK_OUT, [str(copy.pk)], borrower=reader)
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).version, 1)
+
+class OptimisticUpdateViewTest(TestCase):
+    def setUp(self):
+        librarian = User.objects.create_user(username='librarian', password='p@55w0rd')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.login(username='librarian', password='p@55w0rd')
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.poetry = Genre.objects.create(name='Poetry')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157',
+                                        author=self.author, language=Language.objects.create(name='English'))
+        self.book.genre.add(self.fantasy)
+
+    def book_form(self, **changes):
+        data = {'title': self.book.title, 'author': self.author.pk, 'summary': self.book.summary,
+                'isbn': self.book.isbn, 'genre': [self.fantasy.pk], 'language': self.book.language_id}
+        data.update(changes)
+        return data
+
+    def test_form_carries_the_version(self):
+        Book.objects.filter(pk=self.book.pk).update(version=4)
+        response = self.client.get(reverse('book_update', args=[self.book.pk]))
+        self.assertContains(response, 'name="version" value="4"')
+
+    def test_only_changed_fields_are_written(self):
+        response = self.client.post(reverse('book_update', args=[self.book.pk]), self.book_form(title='New Title', version=0))
+        self.assertRedirects(response, self.book.get_absolute_url())
+        # written by someone else meanwhile, but not a field this form changed
+        Book.objects.filter(pk=self.book.pk).update(summary='a longer blurb')
+
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.summary, self.book.version), ('New Title', 'a longer blurb', 1))
+
+    def test_unchanged_form_writes_nothing(self):
+        self.client.post(reverse('book_update', args=[self.book.pk]), self.book_form(version=0))
+        self.assertEqual(Book.objects.get(pk=self.book.pk).version, 0)
+
+    def test_isbn_can_be_typed_with_hyphens(self):
+        # the same ISBN as printed isn't a change
+        self.client.post(reverse('book_update', args=[self.book.pk]), self.book_form(isbn='978-0-306-40615-7', version=0))
+        self.assertEqual(Book.objects.get(pk=self.book.pk).version, 0)
+
+        response = self.client.post(reverse('book_update', args=[self.book.pk]), self.book_form(isbn='978-0-8044-2957-3', version=0))
+        self.assertRedirects(response, self.book.get_absolute_url())
+        self.assertEqual(Book.objects.get(pk=self.book.pk).isbn, '9780804429573')
+
+    def test_concurrent_edits_conflict(self):
+        url = reverse('book_update', args=[self.book.pk])
+        second = self.book_form(summary='Second summary', version=0)
+        self.client.post(url, self.book_form(title='First Title', version=0))
+        response = self.client.post(url, second)
+
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].non_field_errors()
+        self.assertIn('changed by someone else', errors[0])
+        self.assertIn('Title', errors[0])
+        self.assertContains(response, 'name="version" value="1"')
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.summary), ('First Title', 'a little blurb'))
+
+        # submitting again replaces the other edit
+        response = self.client.post(url, dict(second, version=1))
+        self.assertRedirects(response, self.book.get_absolute_url())
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.summary, self.book.version), ('Book Title', 'Second summary', 2))
+
+    def test_genre_changes_are_versioned(self):
+        url = reverse('book_update', args=[self.book.pk])
+        self.client.post(url, self.book_form(title='First Title', version=0))
+        response = self.client.post(url, self.book_form(genre=[self.poetry.pk], version=0))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.book.genre.all()), [self.fantasy])
+
+        self.client.post(url, self.book_form(title='First Title', genre=[self.poetry.pk], version=1))
+        self.assertEqual(list(self.book.genre.all()), [self.poetry])
+
+    def test_author_update(self):
+        url = reverse('author_update', args=[self.author.pk])
+        data = {'first_name': 'John', 'last_name': 'Smith', 'date_of_birth': '', 'date_of_death': ''}
+        self.client.post(url, dict(data, first_name='Jane', version=0))
+        response = self.client.post(url, dict(data, date_of_birth='1950-01-01', version=0))
+        self.assertIn('First name', response.context['form'].non_field_errors()[0])
+        self.assertEqual(Author.objects.values_list('first_name', 'date_of_birth').get(pk=self.author.pk), ('Jane', None))
+
+    def test_tampered_version_is_a_form_error(self):
+        reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='o',
+                                           borrower=reader, due_back=datetime.date.today())
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        posts = [
+            (reverse('book_update', args=[self.book.pk]), self.book_form(title='New Title')),
+            (reverse('author_update', args=[self.author.pk]), {'first_name': 'Jane', 'last_name': 'Smith'}),
+            (reverse('renew-book-librarian', args=[copy.pk]), {'renewal_date': renewal_date}),
+        ]
+        for url, data in posts:
+            for version in (2 ** 70, -1):
+                with self.subTest(url=url, version=version):
+                    response = self.client.post(url, dict(data, version=version))
+                    self.assertEqual(response.status_code, 200)
+                    self.assertTrue(response.context['form'].errors['version'])
+        self.assertEqual(Book.objects.get(pk=self.book.pk).version, 0)
+
+    def test_renewal_conflict(self):
+        reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='o',
+                                           borrower=reader, due_back=datetime.date.today())
+        url = reverse('renew-book-librarian', args=[copy.pk])
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        self.assertEqual(self.client.get(url).context['form'].initial['version'], 0)
+
+        circulation.scan(circulation.CHECK_IN, [str(copy.pk)])
+        response = self.client.post(url, {'renewal_date': renewal_date, 'version': 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertContains(response, 'name="version" value="1"')
+        self.assertIsNone(BookInstance.objects.get(pk=copy.pk).due_back)
+
+        response = self.client.post(url, {'renewal_date': renewal_date, 'version': 1})
+        self.assertRedirects(response, reverse('all-borrowed'))
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).due_back, renewal_date)
@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.urls import rate_limits
+
+LIMITS = {
+    'books': {'ip': '6/h', 'burst': 5, 'page_cost_step': 1},
+    'my-borrowed': {'ip': '600/h', 'user': '60/h', 'burst': 3},
+}
+
+@override_settings(RATE_LIMITS=LIMITS)
+class RateLimitMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for n in range(25):
+            Book.objects.create(title=f'Book {n}', summary='a little blurb', isbn=f'97800000{n:05}', author=author)
+        User.objects.create_user(username='reader', password='p@55w0rd')
+
+    def setUp(self):
+        cache.clear()
+        # buckets are per user now, and the next test's users get the same pks
+        self.addCleanup(cache.clear)
+
+    def test_flood_is_shed_without_queries(self):
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(self.client.get(reverse('books')).status_code, 200)
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as flood:
+            statuses = [self.client.get(reverse('books')).status_code for _ in range(200)]
+        self.assertEqual(statuses.count(200), 5)
+        self.assertEqual(statuses.count(429), 195)
+        # only the admitted requests reached the database (later ones hit the facet cache)
+        self.assertLessEqual(len(flood), 5 * len(one))
+
+    def test_retry_after_and_refill(self):
+        now = 1000000.0
+        with mock.patch('catalog.middleware.time.time', return_value=now):
+            for _ in range(5):
+                self.client.get(reverse('books'))
+            response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '600')
+
+        with mock.patch('catalog.middleware.time.time', return_value=now + 1200):
+            self.assertEqual(self.client.get(reverse('books')).status_code, 200)
+            self.assertEqual(self.client.get(reverse('books')).status_code, 200)
+            self.assertEqual(self.client.get(reverse('books')).status_code, 429)
+
+    def test_buckets_are_per_ip(self):
+        for _ in range(5):
+            self.client.get(reverse('books'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(self.client.get(reverse('books'), REMOTE_ADDR='10.0.0.1').status_code, 429)
+        self.assertEqual(self.client.get(reverse('books'), REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_deep_pages_cost_more(self):
+        # page 3 with a step of 1 costs 3 tokens, so only one fits in a burst of 5
+        self.assertEqual(self.client.get(reverse('books') + '?page=3').status_code, 200)
+        self.assertEqual(self.client.get(reverse('books') + '?page=3').status_code, 429)
+        self.assertEqual(self.client.get(reverse('books')).status_code, 200)
+
+    def test_cost_is_capped_at_the_burst(self):
+        # page 20 would cost 20 tokens, more than the bucket ever holds; it costs the whole burst instead
+        self.assertEqual(self.client.get(reverse('books') + '?page=20').status_code, 404)
+        response = self.client.get(reverse('books') + '?page=20')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3000')
+
+    def test_user_bucket_follows_the_session(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        for n in range(3):
+            self.assertEqual(self.client.get(reverse('my-borrowed'), REMOTE_ADDR=f'10.0.0.{n}').status_code, 200)
+        response = self.client.get(reverse('my-borrowed'), REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    def test_user_bucket_survives_a_new_session(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        for n in range(3):
+            self.client.get(reverse('my-borrowed'), REMOTE_ADDR=f'10.0.0.{n}')
+        self.client.logout()
+        self.client.login(username='reader', password='p@55w0rd')
+        self.assertEqual(self.client.get(reverse('my-borrowed'), REMOTE_ADDR='10.0.0.9').status_code, 429)
+
+    def test_invented_session_cookies_share_the_ip_bucket(self):
+        limits = {'isbn-lookup': {'ip': '6/h', 'user': '60/h', 'burst': 3}}
+        with override_settings(RATE_LIMITS=limits):
+            for n in range(3):
+                self.client.cookies['sessionid'] = f'invented{n}'
+                self.client.post(reverse('isbn-lookup'))
+            self.client.cookies['sessionid'] = 'invented9'
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('isbn-lookup'))
+        self.assertEqual(response.status_code, 429)
+
+    def test_every_user_limit_has_an_ip_limit(self):
+        for name, limit in rate_limits.items():
+            with self.subTest(name=name):
+                self.assertTrue('user' not in limit or 'ip' in limit)
+
+    def test_unlimited_views_pass_through(self):
+        for _ in range(10):
+            self.assertEqual(self.client.get(reverse('authors')).status_code, 200)
@@ -70,3 +70,69 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
         # this will also fail if the urlconf is not defined.
         self.assertEquals(author.get_absolute_url(), '/catalog/author/1')
+
+from catalog.models import Book
+class AuthorBookCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author1 = Author.objects.create(first_name="Joe", last_name="Mama")
+        cls.author2 = Author.objects.create(first_name="Jane", last_name="Papa")
+
+    def test_book_count_increments_on_create(self):
+        Book.objects.create(title='One', summary='blurb', isbn='1', author=self.author1)
+        Book.objects.create(title='Two', summary='blurb', isbn='2', author=self.author1)
+        self.author1.refresh_from_db()
+        self.assertEquals(self.author1.book_count, 2)
+
+    def test_book_count_moves_when_author_changes(self):
+        book = Book.objects.create(title='One', summary='blurb', isbn='1', author=self.author1)
+        book.author = self.author2
+        book.save()
+        self.author1.refresh_from_db()
+        self.author2.refresh_from_db()
+        self.assertEquals(self.author1.book_count, 0)
+        self.assertEquals(self.author2.book_count, 1)
+
+    def test_book_count_decrements_on_delete(self):
+        book = Book.objects.create(title='One', summary='blurb', isbn='1', author=self.author1)
+        book.delete()
+        self.author1.refresh_from_db()
+        self.assertEquals(self.author1.book_count, 0)
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+
+from catalog.isbn import normalize_isbn
+class ISBNTest(TestCase):
+    def test_isbn10_is_converted_to_isbn13(self):
+        self.assertEquals(normalize_isbn('0-306-40615-2'), '9780306406157')
+
+    def test_isbn13_hyphens_and_spaces_are_removed(self):
+        self.assertEquals(normalize_isbn('978 0-306-40615-7'), '9780306406157')
+
+    def test_isbn10_with_x_check_digit(self):
+        self.assertEquals(normalize_isbn('080442957x'), '9780804429573')
+
+    def test_bad_check_digit_is_rejected(self):
+        with self.assertRaises(ValueError):
+            normalize_isbn('9780306406158')
+        with self.assertRaises(ValueError):
+            normalize_isbn('0306406153')
+
+    def test_book_isbn_is_stored_normalized(self):
+        book = Book.objects.create(title='One', summary='blurb', isbn='0-306-40615-2')
+        self.assertEquals(Book.objects.values_list('isbn', flat=True).get(pk=book.pk), '9780306406157')
+
+    def test_lookup_by_either_form(self):
+        book = Book.objects.create(title='One', summary='blurb', isbn='9780306406157')
+        self.assertEquals(Book.objects.get(isbn='0-306-40615-2'), book)
+
+    def test_invalid_isbn_fails_validation(self):
+        book = Book(title='One', summary='blurb', isbn='123456789')
+        with self.assertRaises(ValidationError):
+            book.full_clean()
+
+    def test_isbn_is_unique(self):
+        Book.objects.create(title='One', summary='blurb', isbn='0306406152')
+        with self.assertRaises(IntegrityError):
+            Book.objects.create(title='Two', summary='blurb', isbn='9780306406157')
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import profiling
+from catalog.middleware import ProfilingMiddleware
+from catalog.models import Book
+
+def wait_for_the_sampler():
+    time.sleep(0.05)
+
+class StackSamplerTest(TestCase):
+    def test_collapsed_stacks(self):
+        sampler = profiling.StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        wait_for_the_sampler()
+        sampler.stop()
+        stack, count = sampler.collapsed().splitlines()[0].rsplit(' ', 1)
+        self.assertTrue(stack.endswith('catalog.tests.test_profiling:test_collapsed_stacks;catalog.tests.test_profiling:wait_for_the_sampler'))
+        self.assertGreater(int(count), 0)
+
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157')
+        cls.staff = User.objects.create_user(username='staff', password='p@55w0rd', is_staff=True)
+        User.objects.create_user(username='reader', password='p@55w0rd')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.settings = override_settings(PROFILING_DIR=self.directory)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def profiles(self):
+        return profiling.list_profiles(self.directory)
+
+    def test_off_without_a_directory(self):
+        with override_settings(PROFILING_DIR=None):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+    def test_staff_header(self):
+        self.client.login(username='staff', password='p@55w0rd')
+        response = self.client.get(self.book.get_absolute_url(), HTTP_X_PROFILE='cprofile')
+        [info] = self.profiles()
+        self.assertEqual(response['X-Profile'], info['name'])
+        self.assertEqual(info['path'], self.book.get_absolute_url())
+        self.assertEqual((info['mode'], info['trigger'], info['user'], info['status']), ('cprofile', 'staff', 'staff', 200))
+        self.assertTrue(any('"catalog_book"' in query['sql'] for query in info['queries']))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, info['profile'])))
+        self.assertTrue(info['profile'].endswith('.prof'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_password_reset_links_are_redacted(self):
+        path = reverse('password_reset_confirm', kwargs={'uidb64': 'MQ', 'token': '55d-0123456789abcdef0123'})
+        self.client.get(path + '?next=/')
+        [info] = self.profiles()
+        self.assertEqual(info['path'], reverse('password_reset_confirm', kwargs={'uidb64': '*', 'token': '*'}))
+        with open(os.path.join(self.directory, info['name'])) as f:
+            self.assertNotIn('0123456789abcdef', f.read())
+
+    def test_staff_query_parameter_samples_by_default(self):
+        self.client.login(username='staff', password='p@55w0rd')
+        self.client.get(self.book.get_absolute_url() + '?profile')
+        [info] = self.profiles()
+        self.assertEqual(info['mode'], 'sample')
+        self.assertTrue(info['profile'].endswith('.collapsed'))
+
+    def test_ignored_for_other_users(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        response = self.client.get(self.book.get_absolute_url(), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampling(self):
+        self.client.get(reverse('index'))
+        [info] = self.profiles()
+        self.assertEqual((info['trigger'], info['user']), ('sampled', None))
+
+    @override_settings(PROFILING_KEEP=2)
+    def test_only_the_newest_are_kept(self):
+        self.client.login(username='staff', password='p@55w0rd')
+        for _ in range(3):
+            self.client.get(reverse('index'), HTTP_X_PROFILE='1')
+        self.assertEqual(len(self.profiles()), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_profile_pages(self):
+        self.client.login(username='staff', password='p@55w0rd')
+        name = self.client.get(reverse('index'), HTTP_X_PROFILE='1')['X-Profile']
+        response = self.client.get(reverse('profiles'))
+        self.assertContains(response, reverse('profile-file', args=[name]))
+
+        response = self.client.get(reverse('profile-file', args=[name]))
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['name'], name)
+        response.close()
+        self.assertEqual(self.client.get(reverse('profile-file', args=['settings.py'])).status_code, 404)
+
+    def test_profile_pages_are_staff_only(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        response = self.client.get(reverse('profiles'))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import recommendations
+from catalog.models import Book, BookNeighbor, LoanEvent
+
+class RecommendationsTest(TestCase):
+    def setUp(self):
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='p@55w0rd') for i in range(4)]
+        self.books = [Book.objects.create(title=f'Book {i}', summary='a little blurb', isbn=f'{i}') for i in range(5)]
+
+    def borrow(self, reader, *books):
+        for book in books:
+            LoanEvent.objects.create(book=book, borrower=reader, kind=LoanEvent.CHECKOUT)
+
+    def neighbors(self, book):
+        return [(neighbor.neighbor.title, neighbor.score) for neighbor in BookNeighbor.objects.filter(book=book).order_by('rank')]
+
+    def test_rebuild_ranks_by_shared_borrowers(self):
+        b0, b1, b2, b3, b4 = self.books
+        self.borrow(self.readers[0], b0, b1, b2)
+        self.borrow(self.readers[1], b0, b1)
+        self.borrow(self.readers[2], b0, b3)
+        self.borrow(self.readers[3], b4)
+        recommendations.rebuild_neighbors()
+
+        self.assertEqual(self.neighbors(b0), [('Book 1', 2), ('Book 2', 1), ('Book 3', 1)])
+        self.assertEqual(self.neighbors(b4), [])
+
+    def test_repeat_loans_count_once(self):
+        b0, b1 = self.books[:2]
+        self.borrow(self.readers[0], b0, b1, b1)
+        recommendations.rebuild_neighbors()
+        self.assertEqual(self.neighbors(b0), [('Book 1', 1)])
+
+    def test_neighbors_are_pruned_to_top_n(self):
+        self.borrow(self.readers[0], *self.books)
+        with mock.patch.object(recommendations, 'TOP_N', 2):
+            recommendations.rebuild_neighbors()
+        self.assertEqual(self.neighbors(self.books[0]), [('Book 1', 1), ('Book 2', 1)])
+
+    def test_update_matches_rebuild(self):
+        b0, b1, b2, b3, b4 = self.books
+        self.borrow(self.readers[0], b0, b1)
+        self.borrow(self.readers[1], b1, b2)
+        recommendations.rebuild_neighbors()
+
+        self.borrow(self.readers[1], b0)
+        self.borrow(self.readers[2], b3, b4)
+        self.assertEqual(recommendations.update_neighbors(), 5)
+        incremental = {book.pk: self.neighbors(book) for book in self.books}
+
+        recommendations.rebuild_neighbors()
+        self.assertEqual(incremental, {book.pk: self.neighbors(book) for book in self.books})
+
+    def test_update_without_new_loans_does_nothing(self):
+        self.borrow(self.readers[0], *self.books[:2])
+        recommendations.rebuild_neighbors()
+        self.assertEqual(recommendations.update_neighbors(), 0)
+
+    def test_detail_page_reads_neighbors_in_one_query(self):
+        b0, b1, b2 = self.books[:3]
+        self.borrow(self.readers[0], b0, b1, b2)
+        recommendations.rebuild_neighbors()
+
+        response = self.client.get(reverse('book-detail', args=[b0.pk]))
+        self.assertEqual(response.context['related_books'], [b1, b2])
+        self.assertContains(response, 'Readers also borrowed')
+        # book, neighbors, genres, branch availability and copies
+        with self.assertNumQueries(5):
+            self.client.get(reverse('book-detail', args=[b0.pk]))
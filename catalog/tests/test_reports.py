@@ -0,0 +1,116 @@
+import datetime
+
+from django.contrib.auth.models import User, Permission
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import reports
+from catalog.models import (Book, BookInstance, DailyBookLoans, DailyGenreLoans, DailyLanguageLoans, Genre,
+                            Language, LoanEvent)
+
+class LoanEventTest(TestCase):
+    def setUp(self):
+        self.reader1 = User.objects.create_user(username='reader1', password='p@55w0rd')
+        self.reader2 = User.objects.create_user(username='reader2', password='p@55w0rd')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157')
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def kinds(self):
+        return list(LoanEvent.objects.order_by('pk').values_list('kind', 'borrower__username'))
+
+    def test_checkout_and_return(self):
+        self.copy.status = 'o'
+        self.copy.borrower = self.reader1
+        self.copy.save()
+        self.copy.status = 'a'
+        self.copy.borrower = None
+        self.copy.save()
+        self.assertEqual(self.kinds(), [(LoanEvent.CHECKOUT, 'reader1'), (LoanEvent.RETURN, 'reader1')])
+
+    def test_renewal(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='o', borrower=self.reader1, due_back=datetime.date(2030, 1, 1))
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.due_back = datetime.date(2030, 1, 15)
+        copy.save()
+        self.assertEqual(self.kinds(), [(LoanEvent.CHECKOUT, 'reader1'), (LoanEvent.RENEWAL, 'reader1')])
+
+    def test_change_of_borrower_is_a_return_and_a_checkout(self):
+        self.copy.status = 'o'
+        self.copy.borrower = self.reader1
+        self.copy.save()
+        self.copy.borrower = self.reader2
+        self.copy.save()
+        self.assertEqual(self.kinds(), [(LoanEvent.CHECKOUT, 'reader1'), (LoanEvent.RETURN, 'reader1'), (LoanEvent.CHECKOUT, 'reader2')])
+
+    def test_other_edits_are_not_logged(self):
+        self.copy.imprint = 'Another Imprint'
+        self.copy.save()
+        self.assertEqual(self.kinds(), [])
+
+class LoanRollupTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='p@55w0rd')
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.english = Language.objects.create(name='English')
+        self.book1 = Book.objects.create(title='Book One', summary='a little blurb', isbn='9780306406157', language=self.english)
+        self.book2 = Book.objects.create(title='Book Two', summary='a little blurb', isbn='9780804429573', language=self.english)
+        self.book1.genre.add(self.fantasy)
+        self.today = timezone.localdate()
+
+    def log(self, book, kind, days_ago=0):
+        created = timezone.now() - datetime.timedelta(days=days_ago)
+        return LoanEvent.objects.create(book=book, borrower=self.reader, kind=kind, created=created)
+
+    def test_update_rollups_counts_new_events(self):
+        self.log(self.book1, LoanEvent.CHECKOUT)
+        self.log(self.book1, LoanEvent.CHECKOUT)
+        self.log(self.book1, LoanEvent.RENEWAL)
+        self.log(self.book2, LoanEvent.CHECKOUT)
+        reports.update_rollups()
+
+        book1 = DailyBookLoans.objects.get(day=self.today, book=self.book1)
+        self.assertEqual((book1.checkouts, book1.returns, book1.renewals), (2, 0, 1))
+        self.assertEqual(DailyGenreLoans.objects.get(day=self.today, genre=self.fantasy).checkouts, 2)
+        self.assertEqual(DailyLanguageLoans.objects.get(day=self.today, language=self.english).checkouts, 3)
+
+    def test_update_rollups_is_incremental_and_idempotent(self):
+        self.log(self.book1, LoanEvent.CHECKOUT, days_ago=3)
+        reports.update_rollups()
+        reports.update_rollups()
+        self.log(self.book1, LoanEvent.CHECKOUT)
+        days = reports.update_rollups()
+
+        self.assertEqual(days, [self.today])
+        self.assertEqual(DailyBookLoans.objects.get(book=self.book1, day=self.today - datetime.timedelta(days=3)).checkouts, 1)
+        self.assertEqual(DailyBookLoans.objects.get(book=self.book1, day=self.today).checkouts, 1)
+
+    def test_backfill_rebuilds_range(self):
+        for days_ago in range(10):
+            self.log(self.book2, LoanEvent.RETURN, days_ago=days_ago)
+        DailyBookLoans.objects.create(day=self.today, book=self.book2, returns=99)
+        partitions = reports.backfill_rollups(self.today - datetime.timedelta(days=9), self.today, partition_days=4)
+
+        self.assertEqual(partitions, 3)
+        self.assertEqual(DailyBookLoans.objects.filter(book=self.book2).count(), 10)
+        self.assertEqual(DailyBookLoans.objects.get(book=self.book2, day=self.today).returns, 1)
+
+    def test_most_borrowed(self):
+        self.log(self.book2, LoanEvent.CHECKOUT)
+        self.log(self.book2, LoanEvent.CHECKOUT)
+        self.log(self.book1, LoanEvent.CHECKOUT)
+        reports.update_rollups()
+        report = reports.most_borrowed(self.today, self.today)
+        self.assertEqual([(row['name'], row['checkouts']) for row in report['DailyBookLoans']], [('Book Two', 2), ('Book One', 1)])
+
+    def test_report_view(self):
+        librarian = User.objects.create_user(username='librarian', password='p@55w0rd')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.login(username='librarian', password='p@55w0rd')
+        self.log(self.book1, LoanEvent.CHECKOUT)
+        reports.update_rollups()
+
+        response = self.client.get(reverse('loan-report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/loan_report.html')
+        self.assertContains(response, 'Book One')
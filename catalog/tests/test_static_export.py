@@ -0,0 +1,83 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from catalog import static_export
+from catalog.models import Author, Book, BookInstance
+
+class StaticExportTest(TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+        self.author = Author.objects.create(first_name='Joe', last_name='Mama')
+        self.books = [
+            Book.objects.create(title=f'Book {i:02}', summary='a little blurb', isbn=f'{i}', author=self.author)
+            for i in range(12)
+        ]
+
+    def build(self, **kwargs):
+        return static_export.build(self.output, 'testserver', **kwargs)
+
+    def read(self, path):
+        with open(static_export.output_file(self.output, path)) as f:
+            return f.read()
+
+    def test_full_build_writes_every_page(self):
+        rendered, removed = self.build()
+        self.assertIn('/catalog/books/', rendered)
+        self.assertIn('/catalog/books/page/2/', rendered)
+        self.assertIn('/catalog/authors/', rendered)
+        self.assertIn(f'/catalog/book/{self.books[0].pk}', rendered)
+        self.assertIn(f'/catalog/author/{self.author.pk}', rendered)
+        self.assertIn('/sitemap.xml', rendered)
+
+        self.assertIn('Book 11', self.read('/catalog/books/page/2/'))
+        self.assertIn(f'https://testserver/catalog/book/{self.books[0].pk}</loc>', self.read('/sitemap.xml'))
+
+    def test_pagination_links_lead_to_exported_pages(self):
+        self.build()
+        next_url = re.search(r'href="([^"]*)">next', self.read('/catalog/books/')).group(1)
+        self.assertEqual(next_url, '/catalog/books/page/2/')
+        page = self.read(next_url)
+        self.assertIn('Book 11', page)
+        self.assertEqual(re.search(r'href="([^"]*)">previous', page).group(1), '/catalog/books/')
+
+    def test_manifest_has_etags(self):
+        self.build()
+        with open(os.path.join(self.output, static_export.MANIFEST)) as f:
+            manifest = json.load(f)
+        self.assertTrue(manifest['/catalog/books/']['etag'].startswith('"'))
+
+    def test_rebuild_without_changes_renders_nothing(self):
+        self.build()
+        rendered, removed = self.build()
+        self.assertEqual((rendered, removed), ([], []))
+
+    def test_only_affected_pages_are_rerendered(self):
+        self.build()
+        BookInstance.objects.create(book=self.books[3], imprint='Unlikely Imprint, 2016', status='a')
+        rendered, removed = self.build()
+        # the author list shows the author's copy count
+        self.assertEqual(rendered, ['/catalog/authors/', f'/catalog/book/{self.books[3].pk}'])
+
+    def test_title_change_rerenders_list_and_author_pages(self):
+        self.build()
+        self.books[0].title = 'Book 00, revised'
+        self.books[0].save()
+        rendered, removed = self.build()
+        self.assertEqual(set(rendered), {'/catalog/books/', f'/catalog/book/{self.books[0].pk}', f'/catalog/author/{self.author.pk}'})
+        self.assertIn('Book 00, revised', self.read('/catalog/books/'))
+
+    def test_deleted_pages_are_removed(self):
+        self.build()
+        path = self.books[-1].get_absolute_url()
+        self.books[-1].delete()
+        rendered, removed = self.build()
+        self.assertEqual(removed, [path])
+        self.assertIn('/catalog/books/page/2/', rendered)
+        self.assertFalse(os.path.exists(static_export.output_file(self.output, path)))
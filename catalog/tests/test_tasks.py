@@ -0,0 +1,172 @@
+import re
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User, Permission
+from django.core import mail
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import taskqueue
+from catalog.models import Author, Book, Task
+
+calls = []
+
+@taskqueue.task(name='tests.record')
+def record(value, repeat=1):
+    calls.extend([value] * repeat)
+
+@taskqueue.task(name='tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+@taskqueue.task(name='tests.slow')
+def slow(seconds):
+    time.sleep(seconds)
+    calls.append(Task.objects.get(name='tests.slow').locked_at)
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_task_with_arguments(self):
+        queued = record.delay('a', repeat=2)
+        self.assertEqual(queued.name, 'tests.record')
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertEqual(calls, [])
+
+    def test_worker_runs_queued_task(self):
+        record.delay('a', repeat=2)
+        self.assertEqual(taskqueue.run_pending('test-worker'), 1)
+        self.assertEqual(calls, ['a', 'a'])
+
+        finished = Task.objects.get()
+        self.assertEqual(finished.status, Task.DONE)
+        self.assertEqual(finished.attempts, 1)
+        self.assertIsNotNone(finished.duration)
+
+    def test_claimed_task_is_not_claimed_again(self):
+        record.delay('a')
+        self.assertIsNotNone(taskqueue.claim('worker-1'))
+        self.assertIsNone(taskqueue.claim('worker-2'))
+
+    def test_task_not_due_yet_is_not_claimed(self):
+        taskqueue.enqueue('tests.record', ['a'], run_after=timezone.now() + timezone.timedelta(minutes=5))
+        self.assertIsNone(taskqueue.claim('test-worker'))
+
+    def test_failed_task_is_retried_then_marked_failed(self):
+        explode.delay()
+        taskqueue.run_pending('test-worker')
+        retried = Task.objects.get()
+        self.assertEqual(retried.status, Task.QUEUED)
+        self.assertGreater(retried.run_after, timezone.now())
+        self.assertIn('boom', retried.last_error)
+
+        Task.objects.update(run_after=timezone.now())
+        taskqueue.run_pending('test-worker')
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_unknown_task_fails(self):
+        taskqueue.enqueue('tests.missing', max_attempts=1)
+        taskqueue.run_pending('test-worker')
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_stale_running_task_is_requeued(self):
+        record.delay('a')
+        taskqueue.claim('dead-worker')
+        Task.objects.update(locked_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(taskqueue.requeue_stale(), (1, 0))
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+
+    def test_requeued_task_is_not_overwritten_by_its_old_worker(self):
+        record.delay('a')
+        stale = taskqueue.claim('slow-worker')
+        Task.objects.update(locked_at=timezone.now() - timezone.timedelta(hours=1))
+        taskqueue.requeue_stale()
+        taskqueue.claim('new-worker')
+
+        with self.assertRaises(taskqueue.LostLock):
+            taskqueue.run(stale)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.locked_by, task.attempts), (Task.RUNNING, 'new-worker', 2))
+
+    def test_stale_task_on_its_last_attempt_fails(self):
+        taskqueue.enqueue('tests.record', ['a'], max_attempts=1)
+        taskqueue.claim('dead-worker')
+        Task.objects.update(locked_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(taskqueue.requeue_stale(), (0, 1))
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.locked_by), (Task.FAILED, ''))
+        self.assertIsNotNone(failed.finished)
+        self.assertIsNone(taskqueue.claim('test-worker'))
+
+    def test_stats_per_task(self):
+        record.delay('a')
+        record.delay('b')
+        explode.delay()
+        taskqueue.run_pending('test-worker')
+        stats = {row['name']: row for row in taskqueue.task_stats()}
+        self.assertEqual(stats['tests.record']['done'], 2)
+        self.assertIsNotNone(stats['tests.record']['avg_duration'])
+        self.assertEqual(stats['tests.explode']['queued'], 1)
+
+class HeartbeatTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    @mock.patch('catalog.taskqueue.HEARTBEAT', 0.01)
+    def test_running_task_keeps_its_lock_fresh(self):
+        slow.delay(0.2)
+        claimed = taskqueue.claim('test-worker')
+        locked_at = claimed.locked_at
+        taskqueue.run(claimed)
+        self.assertEqual(claimed.status, Task.DONE)
+        # refreshed while the task ran, so a long task isn't requeued under its worker
+        self.assertGreater(calls[0], locked_at)
+
+class BackgroundCatalogTasksTest(TestCase):
+    def setUp(self):
+        librarian = User.objects.create_user(username='librarian', password='p@55w0rd', email='librarian@example.com')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.login(username='librarian', password='p@55w0rd')
+        self.author = Author.objects.create(first_name='Joe', last_name='Mama')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157', author=self.author)
+
+    def test_book_delete_is_queued(self):
+        response = self.client.post(reverse('book_delete', args=[self.book.pk]))
+        self.assertRedirects(response, reverse('books'))
+        self.assertTrue(Book.objects.filter(pk=self.book.pk).exists())
+
+        taskqueue.run_pending('test-worker')
+        self.assertFalse(Book.objects.filter(pk=self.book.pk).exists())
+
+    def test_author_delete_is_queued(self):
+        self.client.post(reverse('author_delete', args=[self.author.pk]))
+        taskqueue.run_pending('test-worker')
+        self.assertFalse(Author.objects.filter(pk=self.author.pk).exists())
+        self.book.refresh_from_db()
+        self.assertIsNone(self.book.author)
+
+    def test_password_reset_email_is_sent_by_worker(self):
+        self.client.logout()
+        self.client.post(reverse('password_reset'), {'email': 'librarian@example.com'})
+        self.assertEqual(len(mail.outbox), 0)
+
+        taskqueue.run_pending('test-worker')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['librarian@example.com'])
+
+    def test_password_reset_token_is_not_queued(self):
+        self.client.logout()
+        self.client.post(reverse('password_reset'), {'email': 'librarian@example.com'})
+        arguments = Task.objects.get().arguments
+        taskqueue.run_pending('test-worker')
+
+        link = re.search(r'/accounts/reset/([^/]+)/([^/]+)/', mail.outbox[0].body)
+        uid, token = link.groups()
+        self.assertNotIn(uid, arguments)
+        self.assertNotIn(token, arguments)
+        # the link made by the worker works
+        response = self.client.get(link.group(0), follow=True)
+        self.assertTrue(response.context['validlink'])
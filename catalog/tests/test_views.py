@@ -1,4 +1,5 @@
 import datetime
+import json
 import uuid
 
 from django.test import TestCase
@@ -46,6 +47,170 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(response.context['is_paginated'] == True)
         self.assertTrue(len(response.context['author_list']) == 3)
 
+class AuthorDetailViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Joe', last_name='Mama')
+        number_of_books = 13
+
+        for book_id in range(number_of_books):
+            Book.objects.create(
+                title=f'Book {book_id:02}',
+                summary='a little blurb',
+                isbn=f'{book_id}',
+                author=cls.author,
+            )
+
+    def test_view_shows_first_page_of_books(self):
+        response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['books']), 10)
+        self.assertEqual(response.context['books'][0].title, 'Book 00')
+        self.assertIsNotNone(response.context['next_page_url'])
+        self.assertContains(response, 'Books (13)')
+
+    def test_summaries_are_not_loaded(self):
+        response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        self.assertIn('summary', response.context['books'][0].get_deferred_fields())
+
+    def test_fragment_returns_next_page(self):
+        response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        response = self.client.get(response.context['next_page_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/author_book_list.html')
+        self.assertEqual([book.title for book in response.context['books']], ['Book 10', 'Book 11', 'Book 12'])
+        self.assertIsNone(response.context['next_page_url'])
+
+    def test_fragment_starts_over_for_an_out_of_range_id(self):
+        url = reverse('author-books', args=[self.author.pk])
+        response = self.client.get(url, {'after_title': 'Book 09', 'after_id': '99999999999999999999999'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['books'][0].title, 'Book 00')
+
+    def test_fragment_404_for_unknown_author(self):
+        response = self.client.get(reverse('author-books', args=[self.author.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+class BookListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author1 = Author.objects.create(first_name='Joe', last_name='Mama')
+        cls.author2 = Author.objects.create(first_name='Jane', last_name='Papa')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        cls.english = Language.objects.create(name='English')
+        cls.french = Language.objects.create(name='French')
+
+        # 12 books: author1 writes the even ones in English, every third book is also poetry
+        for book_id in range(12):
+            book = Book.objects.create(
+                title=f'Book {book_id:02}',
+                summary='a little blurb',
+                isbn=f'{book_id}',
+                author=cls.author1 if book_id % 2 == 0 else cls.author2,
+                language=cls.english if book_id % 2 == 0 else cls.french,
+            )
+            book.genre.add(cls.fantasy)
+            if book_id % 3 == 0:
+                book.genre.add(cls.poetry)
+
+    def facet(self, response, name):
+        facet = next(facet for facet in response.context['facets'] if facet['name'] == name)
+        return {option['name']: option['count'] for option in facet['options']}
+
+    def test_unfiltered_list_is_paginated(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['book_list']), 10)
+
+    def test_facet_counts(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(self.facet(response, 'genre'), {'Fantasy': 12, 'Poetry': 4})
+        self.assertEqual(self.facet(response, 'language'), {'English': 6, 'French': 6})
+        self.assertEqual(self.facet(response, 'author'), {'Mama, Joe': 6, 'Papa, Jane': 6})
+
+    def test_filter_by_genre_and_language(self):
+        response = self.client.get(reverse('books'), {'genre': self.poetry.pk, 'language': self.english.pk})
+        self.assertEqual([book.title for book in response.context['book_list']], ['Book 00', 'Book 06'])
+        # each facet is counted with the other facets' selections applied
+        self.assertEqual(self.facet(response, 'genre'), {'Fantasy': 6, 'Poetry': 2})
+        self.assertEqual(self.facet(response, 'language'), {'English': 2, 'French': 2})
+        self.assertEqual(self.facet(response, 'author'), {'Mama, Joe': 2})
+
+    def test_values_that_are_not_ids_are_ignored(self):
+        response = self.client.get(reverse('books'), {'genre': ['\u00b2', '-1', '99999999999999999999999'], 'author': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['book_list']), 10)
+
+    def test_values_within_a_facet_are_alternatives(self):
+        response = self.client.get(reverse('books') + f'?author={self.author1.pk}&author={self.author2.pk}')
+        self.assertEqual(response.context['paginator'].count, 12)
+
+    def test_facet_counts_are_computed_in_one_query(self):
+        self.client.get(reverse('books'), {'genre': self.fantasy.pk})
+        # cached now, so just the page and the paginator count
+        with self.assertNumQueries(2):
+            self.client.get(reverse('books'), {'genre': self.fantasy.pk})
+
+    def test_facet_counts_refresh_after_edit(self):
+        self.client.get(reverse('books'))
+        Book.objects.get(title='Book 01').genre.add(self.poetry)
+        response = self.client.get(reverse('books'))
+        self.assertEqual(self.facet(response, 'genre'), {'Fantasy': 12, 'Poetry': 5})
+
+    def test_pagination_links_keep_filters(self):
+        response = self.client.get(reverse('books'), {'genre': self.fantasy.pk})
+        self.assertContains(response, f'href="/catalog/books/page/2/?genre={self.fantasy.pk}"')
+
+    def test_pagination_links_use_page_urls(self):
+        response = self.client.get(reverse('books-page', kwargs={'page': 2}))
+        self.assertContains(response, 'href="/catalog/books/">previous')
+
+class ISBNLookupViewTest(TestCase):
+    def setUp(self):
+        librarian = User.objects.create_user(username='librarian', password='p@55w0rd')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        User.objects.create_user(username='reader', password='p@55w0rd')
+
+        test_author = Author.objects.create(first_name='Joe', last_name='Mama')
+        self.book = Book.objects.create(title='Book Title', summary='a little blurb', isbn='9780306406157', author=test_author)
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='o')
+
+    def lookup(self, isbns):
+        return self.client.post(reverse('isbn-lookup'), json.dumps({'isbns': isbns}), content_type='application/json')
+
+    def test_redirect_if_not_permitted(self):
+        self.client.login(username='reader', password='p@55w0rd')
+        response = self.lookup(['9780306406157'])
+        self.assertEqual(response.status_code, 302)
+
+    def test_resolves_batch_in_one_query(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        isbns = ['0-306-40615-2', '9780804429573', 'not an isbn']
+        # session, user, user and group permissions, then a single book lookup
+        with self.assertNumQueries(5):
+            response = self.lookup(isbns)
+        results = response.json()['results']
+
+        self.assertEqual([result['scanned'] for result in results], isbns)
+        self.assertEqual(results[0]['book']['id'], self.book.pk)
+        self.assertEqual(results[0]['book']['available_copies'], [str(self.copy.pk)])
+        self.assertTrue(results[1]['valid'])
+        self.assertIsNone(results[1]['book'])
+        self.assertFalse(results[2]['valid'])
+
+    def test_rejects_malformed_body(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        response = self.client.post(reverse('isbn-lookup'), 'isbns', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_values_that_are_not_strings(self):
+        self.client.login(username='librarian', password='p@55w0rd')
+        self.assertEqual(self.lookup([['9780306406157']]).status_code, 400)
+        self.assertEqual(self.lookup([{'isbn': '9780306406157'}]).status_code, 400)
+
 class LoanedBooksByUserListViewTest(TestCase):
     def setUp(self):
         test_user1 = User.objects.create_user(username='testuser1', password="p@55w0rd")
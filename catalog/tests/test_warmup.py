@@ -0,0 +1,26 @@
+from django.contrib.contenttypes.models import ContentType
+from django.test import TransactionTestCase
+
+from catalog.models import Book
+from locallibrary import warmup
+
+class WarmUpTest(TransactionTestCase):
+    def test_phases(self):
+        ContentType.objects.clear_cache()
+        # the flush after this test recreates the content types, so don't keep the old ones
+        self.addCleanup(ContentType.objects.clear_cache)
+        timings = warmup.warm_up(report=lambda *timing: None)
+        self.assertEqual([name for name, seconds, detail in timings], [name for name, phase in warmup.PHASES])
+        for name, seconds, detail in timings:
+            self.assertNotIn('failed', detail)
+            self.assertNotIn('missing', detail)
+        with self.assertNumQueries(0):
+            ContentType.objects.get_for_model(Book)
+
+    def test_failing_phase_does_not_stop_the_rest(self):
+        def broken():
+            raise RuntimeError('no database')
+
+        timings = warmup.warm_up([('broken', broken), ('urls', warmup.load_urls)], report=lambda *timing: None)
+        self.assertEqual(timings[0][2], "failed: RuntimeError('no database')")
+        self.assertEqual(timings[1][0], 'urls')
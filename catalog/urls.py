@@ -4,9 +4,13 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('books/', views.BookListView.as_view(), name='books'),
+    # the same pages as ?page=N, at paths a static export can be written to
+    path('books/page/<int:page>/', views.BookListView.as_view(), name='books-page'),
     path('book/<int:pk>', views.BookDetailView.as_view(), name="book-detail"),
     path('authors/', views.AuthorListView.as_view(), name='authors'),
+    path('authors/page/<int:page>/', views.AuthorListView.as_view(), name='authors-page'),
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name="author-detail"),
+    path('author/<int:pk>/books/', views.author_books, name='author-books'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name="my-borrowed"),
     path('allborrowed/', views.AllLoanedBooksListView.as_view(), name="all-borrowed"),
     # this one is not a class so no `.as_view` used here
@@ -17,4 +21,31 @@ urlpatterns = [
     path('book/create/', views.BookCreate.as_view(), name='book_create'),
     path('book/<int:pk>/update/', views.BookUpdate.as_view(), name='book_update'),
     path('book/<int:pk>/delete/', views.BookDelete.as_view(), name='book_delete'),
+    path('isbn/lookup/', views.isbn_lookup, name='isbn-lookup'),
+    path('circulation/scan/', views.scan_copies, name='scan-copies'),
+    path('reports/loans/', views.loan_report, name='loan-report'),
+    path('branches/', views.BranchListView.as_view(), name='branches'),
+    path('branch/<int:branch>/books/', views.BranchBookListView.as_view(), name='branch-books'),
+    path('branch/<int:branch>/available/', views.BranchBookListView.as_view(available_only=True), name='branch-available'),
+    path('branch/<int:branch>/book/<int:pk>', views.BranchBookDetailView.as_view(), name='branch-book-detail'),
+    path('branch/<int:branch>/borrowed/', views.BranchLoanedBooksListView.as_view(), name='branch-borrowed'),
+    path('circulation/transfer/', views.transfer_copies, name='transfer-copies'),
+    path('changes/', views.change_feed, name='change-feed'),
+    path('profiles/', views.profile_list, name='profiles'),
+    path('profiles/<str:name>', views.profile_file, name='profile-file'),
 ]
+
+# Admission control for the expensive views, read by catalog.middleware.RateLimitMiddleware.
+# Each client IP ('ip') and logged in user ('user') may make requests at the given
+# rate with bursts of up to 'burst'; deep pages cost an extra token per 'page_cost_step' pages.
+list_limit = {'ip': '60/m', 'burst': 30, 'page_cost_step': 10}
+rate_limits = {
+    'books': list_limit,
+    'books-page': list_limit,
+    'authors': list_limit,
+    'authors-page': list_limit,
+    'branch-books': list_limit,
+    'branch-available': list_limit,
+    'my-borrowed': {'ip': '60/m', 'user': '20/m', 'burst': 10},
+    'isbn-lookup': {'ip': '60/m', 'user': '30/m', 'burst': 10},
+}
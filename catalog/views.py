@@ -1,60 +1,170 @@
 import datetime
 
 from django.shortcuts import render
-from catalog.models import Book, Author, BookInstance, Genre
+from catalog.models import MAX_ID, Book, Author, BookInstance
+from catalog import caching
 
 # Create your views here.
 def index(request):
     """View function for homepage of site."""
 
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-    # 'all()' is implied below
-    num_authors = Author.objects.count()
-    num_genres = Genre.objects.count()
     num_visits = request.session.get('num_visits', 0)
     request.session['num_visits'] = num_visits + 1
 
-    context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_genres': num_genres,
-        'num_visits': num_visits,
-    }
+    context = dict(caching.catalog_counts(), num_visits=num_visits)
 
     return render(request, 'index.html', context=context)
 
 from django.views import generic
 
-class BookListView(generic.ListView):
+from catalog import authors, facets
+from django.urls import reverse
+
+class PageRoutesMixin:
+    """
+    Link the pages of a list to its page/N/ urls rather than to ?page=N.
+
+    The static export writes each page to its page/N/ path, where a query
+    string would be ignored, and a page kwarg in the url wins over ?page=.
+    """
+    # url names of the first page and of the others, which take a page kwarg
+    page_routes = None
+
+    def page_querystring(self):
+        """Query parameters other than the page, kept on every page link."""
+        return ''
+
+    def page_url(self, number):
+        first, other = self.page_routes
+        url = reverse(first) if number == 1 else reverse(other, kwargs={'page': number})
+        querystring = self.page_querystring()
+        return f'{url}?{querystring}' if querystring else url
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if page is not None:
+            context['previous_page_url'] = self.page_url(page.previous_page_number()) if page.has_previous() else None
+            context['next_page_url'] = self.page_url(page.next_page_number()) if page.has_next() else None
+        return context
+
+class BookListView(PageRoutesMixin, generic.ListView):
     model = Book
     paginate_by = 10
     context_object_name = 'book_list'
-    queryset = Book.objects.all()
+    queryset = Book.objects.order_by('title', 'id')
     # queryset = Book.objects.filter(title__icontains='war')[:5]
     template_name = 'books/book_list.html'
+    page_routes = ('books', 'books-page')
 
     # we can override the get_queryset() method to change the list of records returned. This is more flexible than just setting the queryset attribute as we did in the preceding code fragment (though there is no real benefit in this case):
 
     # def get_queryset(self):
     #     return Book.objects.filter(title__icontains='war')[:5]
 
+    def get_queryset(self):
+        self.filters = facets.parse_filters(self.request.GET)
+        return facets.filter_books(super().get_queryset(), self.filters)
+
+    def page_querystring(self):
+        return facets.querystring(self.filters)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['facets'] = facets.cached_facet_counts(self.filters)
+        context['facet_querystring'] = facets.querystring(self.filters)
+        return context
+
 class BookDetailView(generic.DetailView):
     model = Book
 
-class AuthorListView(generic.ListView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # precomputed by catalog.recommendations, read in rank order through the (book, rank) index
+        neighbors = self.object.neighbors.select_related('neighbor').order_by('rank')
+        context['related_books'] = [neighbor.neighbor for neighbor in neighbors]
+        context['copies'] = self.get_copies()
+        context['stock'] = self.object.branchstock_set.filter(copies__gt=0).select_related('branch').order_by('branch__name')
+        return context
+
+    def get_copies(self):
+        return self.object.bookinstance_set.select_related('branch')
+
+class AuthorListView(PageRoutesMixin, generic.ListView):
     model = Author
     paginate_by = 10
     context_object_name = 'author_list'
-    queryset = Author.objects.all()
+    queryset = Author.objects.order_by('last_name', 'first_name', 'id')
     template_name = 'authors/author_list.html'
+    page_routes = ('authors', 'authors-page')
+
+    def get_queryset(self):
+        self.options = authors.parse_options(self.request.GET)
+        return authors.filter_authors(super().get_queryset(), self.options)
+
+    def page_querystring(self):
+        return authors.querystring(self.options)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        # rather than a COUNT over up to every author on each page
+        paginator.count = authors.count_authors(self.options)
+        return paginator
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['options'] = self.options
+        context['sorts'] = [(value, label) for value, label, ordering in authors.SORTS]
+        context['statuses'] = authors.STATUSES
+        context['author_querystring'] = authors.querystring(self.options)
+        return context
 
 class AuthorDetailView(generic.DetailView):
     model = Author
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(author_books_page(self.object))
+        return context
+
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils.http import urlencode
+from django.urls import reverse
+
+AUTHOR_BOOKS_PAGE_SIZE = 10
+
+def author_books_page(author, after_title=None, after_id=None, page_size=AUTHOR_BOOKS_PAGE_SIZE):
+    """Return one keyset page of an author's books, ordered by title, plus the url of the next page."""
+    # summaries can be up to 1000 chars each, so only the columns the list shows are loaded
+    books = Book.objects.filter(author=author).only('id', 'title').order_by('title', 'id')
+    if after_id is not None:
+        books = books.filter(Q(title__gt=after_title) | Q(title=after_title, id__gt=after_id))
+    books = list(books[:page_size + 1])
+
+    next_page_url = None
+    if len(books) > page_size:
+        books = books[:page_size]
+        last = books[-1]
+        next_page_url = reverse('author-books', args=[str(author.pk)]) + '?' + urlencode({'after_title': last.title, 'after_id': last.pk})
+
+    return {'books': books, 'next_page_url': next_page_url}
+
+def author_books(request, pk):
+    """HTML fragment with the next page of an author's books, fetched by the author detail page."""
+    author = get_object_or_404(Author.objects.only('id'), pk=pk)
+    try:
+        after_id = int(request.GET['after_id'])
+        after_title = request.GET['after_title']
+    except (KeyError, ValueError):
+        after_id = after_title = None
+    if after_id is not None and not 0 <= after_id <= MAX_ID:
+        # beyond what a database integer holds, so start from the first page
+        after_id = after_title = None
+
+    context = author_books_page(author, after_title, after_id)
+    return render(request, 'catalog/author_book_list.html', context)
+
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
@@ -81,7 +191,8 @@ from django.contrib.auth.decorators import permission_required
 from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponseRedirect
 from django.urls import reverse
-from catalog.forms import RenewBookForm
+from catalog.forms import RenewBookForm, VersionField
+from catalog.models import ConcurrentUpdate
 
 @permission_required('catalog.can_mark_returned')
 def renew_book_librarian(request, pk):
@@ -92,14 +203,22 @@ def renew_book_librarian(request, pk):
 
         if form.is_valid():
             book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
-
-            # redirect to new url
-            return HttpResponseRedirect(reverse('all-borrowed'))
+            try:
+                book_instance.save_changes(['due_back'], version=form.cleaned_data['version'])
+            except ConcurrentUpdate:
+                # show the copy as it is now, and the form again with its current version
+                book_instance = get_object_or_404(BookInstance, pk=pk)
+                data = request.POST.copy()
+                data['version'] = book_instance.version
+                form = RenewBookForm(data)
+                form.add_error(None, 'This copy was renewed, returned or otherwise changed while you were renewing it. Check it below and submit again.')
+            else:
+                # redirect to new url
+                return HttpResponseRedirect(reverse('all-borrowed'))
 
     else:
         proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
-        form = RenewBookForm(initial={'renewal_date': proposed_renewal_date})
+        form = RenewBookForm(initial={'renewal_date': proposed_renewal_date, 'version': book_instance.version})
 
     context = {
         'form': form,
@@ -108,9 +227,62 @@ def renew_book_librarian(request, pk):
 
     return render(request, 'catalog/book_renew_librarian.html', context)
 
+from django.contrib import messages
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from catalog.models import Author, Book, Language, BookInstance, Genre
+from catalog import tasks
+from catalog.models import Author, Book, Language, BookInstance
+
+from django.db import transaction
+
+class OptimisticUpdateMixin:
+    """
+    Save an UpdateView's form with VersionedModel.save_changes().
+
+    The form carries the version of the object it was rendered with in a hidden
+    field, and only the fields the user changed are written. If the object was
+    saved by someone else in between, the form is shown again with an error
+    naming the fields that now differ, and with the new version, so submitting
+    it again overwrites their changes knowingly.
+    """
+
+    def get_initial(self):
+        return {**super().get_initial(), 'version': self.object.version}
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        form.fields['version'] = VersionField()
+        return form
+
+    def form_valid(self, form):
+        self.object = form.save(commit=False)
+        changed = [name for name in form.changed_data if name != 'version']
+        if changed:
+            fields = [name for name in changed if not self.model._meta.get_field(name).many_to_many]
+            try:
+                with transaction.atomic():
+                    self.object.save_changes(fields, version=form.cleaned_data['version'])
+                    if len(fields) < len(changed):
+                        form.save_m2m()
+            except ConcurrentUpdate:
+                return self.conflict(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+    def conflict(self, form):
+        self.object = self.get_object()
+        current = self.get_form_class()(instance=self.object)
+        differ = [
+            str(form.fields[name].label or name) for name in form.fields
+            if name != 'version' and form.fields[name].has_changed(current[name].initial, form[name].data)
+        ]
+        form.data = form.data.copy()
+        form.data['version'] = self.object.version
+        form.instance = self.object
+        message = f'This {self.model._meta.verbose_name} was changed by someone else while you were editing it, and your changes have not been saved.'
+        if differ:
+            message += f' The saved values of {", ".join(differ)} differ from yours; submit again to replace them.'
+        form.add_error(None, message)
+        return self.form_invalid(form)
 
 class BookCreate(CreateView):
     model = Book
@@ -118,15 +290,31 @@ class BookCreate(CreateView):
     initial = {'language': 'English'}
     permission_required = 'catalog.can_mark_returned'
 
-class BookUpdate(UpdateView):
+class BookUpdate(OptimisticUpdateMixin, UpdateView):
     model = Book
     fields = '__all__'
     permission_required = 'catalog.can_mark_returned'
 
-class BookDelete(DeleteView):
+class BackgroundDeleteMixin:
+    """
+    Queue the delete as a background task instead of running it in the request.
+
+    Deleting nulls out every related row through SET_NULL, which is slow for
+    big authors and books, so it is left to `manage.py run_worker`.
+    """
+    delete_task = None
+
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        self.delete_task.delay(self.object.pk)
+        messages.info(request, f'{self.object} will be deleted shortly.')
+        return HttpResponseRedirect(self.get_success_url())
+
+class BookDelete(BackgroundDeleteMixin, DeleteView):
     model = Book
     success_url = reverse_lazy('books')
     permission_required = 'catalog.can_mark_returned'
+    delete_task = tasks.delete_book
 
 class AuthorCreate(CreateView):
     model = Author
@@ -134,12 +322,247 @@ class AuthorCreate(CreateView):
     initial = {'date_of_death': '05/01/2018'}
     permission_required = 'catalog.can_mark_returned'
 
-class AuthorUpdate(UpdateView):
+class AuthorUpdate(OptimisticUpdateMixin, UpdateView):
     model = Author
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
     permission_required = 'catalog.can_mark_returned'
 
-class AuthorDelete(DeleteView):
+class AuthorDelete(BackgroundDeleteMixin, DeleteView):
     model = Author
     success_url = reverse_lazy('authors')
     permission_required = 'catalog.can_mark_returned'
+    delete_task = tasks.delete_author
+
+import json
+
+from django.db import connection
+from django.db.models import FilteredRelation
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_POST
+from catalog.isbn import normalize_isbn
+
+ISBN_LOOKUP_MAX = 5000
+
+@require_POST
+@permission_required('catalog.can_mark_returned')
+def isbn_lookup(request):
+    """
+    Resolve a batch of scanned ISBNs to books and their available copies.
+
+    Expects a JSON body like {"isbns": ["0-306-40615-2", ...]} and answers with
+    one result per scanned value, in the order they were sent.
+    """
+    try:
+        scanned = json.loads(request.body)['isbns']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Expected a JSON object with an "isbns" list.')
+    if not isinstance(scanned, list) or len(scanned) > ISBN_LOOKUP_MAX or not all(isinstance(value, str) for value in scanned):
+        return HttpResponseBadRequest(f'"isbns" must be a list of at most {ISBN_LOOKUP_MAX} strings.')
+
+    normalized = {}
+    for value in scanned:
+        try:
+            normalized[value] = normalize_isbn(value)
+        except ValueError:
+            normalized[value] = None
+
+    # one row per available copy (or a single row with no copy), so a chunk is one query
+    books = {}
+    isbns = sorted({isbn for isbn in normalized.values() if isbn})
+    chunk_size = connection.features.max_query_params or len(isbns) or 1
+    for start in range(0, len(isbns), chunk_size):
+        rows = (Book.objects
+                .filter(isbn__in=isbns[start:start + chunk_size])
+                .annotate(available_copy=FilteredRelation('bookinstance', condition=Q(bookinstance__status__exact='a')))
+                .values_list('pk', 'isbn', 'title', 'author__first_name', 'author__last_name', 'available_copy__id'))
+        for pk, isbn, title, first_name, last_name, copy_id in rows:
+            book = books.setdefault(isbn, {
+                'id': pk,
+                'title': title,
+                'author': f'{last_name}, {first_name}' if last_name is not None else None,
+                'url': reverse('book-detail', args=[str(pk)]),
+                'available_copies': [],
+            })
+            if copy_id is not None:
+                book['available_copies'].append(str(copy_id))
+
+    results = [
+        {'scanned': value, 'isbn': normalized[value], 'valid': normalized[value] is not None, 'book': books.get(normalized[value])}
+        for value in scanned
+    ]
+    return JsonResponse({'results': results})
+
+from django.utils import timezone
+from catalog import reports
+
+@permission_required('catalog.can_mark_returned')
+def loan_report(request):
+    """Most borrowed books, genres and languages this month, read from the daily rollups."""
+    today = timezone.localdate()
+    first_day = today.replace(day=1)
+    context = {
+        'first_day': first_day,
+        'last_day': today,
+        'report': reports.most_borrowed(first_day, today),
+    }
+    return render(request, 'catalog/loan_report.html', context)
+
+from django.contrib.auth.models import User
+from catalog import circulation
+
+@require_POST
+@permission_required('catalog.can_mark_returned')
+def scan_copies(request):
+    """
+    Check a batch of scanned copies in or out.
+
+    Expects a JSON body like {"action": "checkin", "copies": ["<uuid>", ...]}.
+    Check-outs also need a "borrower" username and may give a "due_back" date.
+    """
+    try:
+        batch = json.loads(request.body)
+        action = batch['action']
+        scanned = batch['copies']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Expected a JSON object with "action" and "copies".')
+    if action not in circulation.ACTIONS:
+        return HttpResponseBadRequest(f'"action" must be one of {", ".join(circulation.ACTIONS)}.')
+    if not isinstance(scanned, list) or len(scanned) > circulation.MAX_SCANS or not all(isinstance(value, str) for value in scanned):
+        return HttpResponseBadRequest(f'"copies" must be a list of at most {circulation.MAX_SCANS} strings.')
+
+    borrower = due_back = None
+    if action == circulation.CHECK_OUT:
+        borrower = User.objects.filter(username=batch.get('borrower')).first()
+        if borrower is None:
+            return HttpResponseBadRequest('"borrower" must be the username of an existing user.')
+        if batch.get('due_back'):
+            try:
+                due_back = datetime.datetime.strptime(batch['due_back'], '%Y-%m-%d').date()
+            except (ValueError, TypeError):
+                return HttpResponseBadRequest('"due_back" must be a date in YYYY-MM-DD format.')
+
+    results = circulation.scan(action, scanned, borrower=borrower, due_back=due_back)
+    summary = {}
+    for result in results:
+        summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+    return JsonResponse({'results': results, 'summary': summary})
+
+from catalog import branches
+from catalog.models import Branch, BranchStock
+
+class BranchListView(generic.ListView):
+    model = Branch
+
+class BranchMixin:
+    """Scopes a view to the branch given in the url."""
+
+    def get_branch(self):
+        if not hasattr(self, 'branch'):
+            self.branch = get_object_or_404(Branch, pk=self.kwargs['branch'])
+        return self.branch
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['branch'] = self.get_branch()
+        return context
+
+class BranchBookListView(BranchMixin, generic.ListView):
+    """Books held by a branch, read from its BranchStock rows rather than by counting copies."""
+    paginate_by = 10
+    context_object_name = 'stock_list'
+    template_name = 'catalog/branch_book_list.html'
+    available_only = False
+
+    def get_queryset(self):
+        stock = BranchStock.objects.filter(branch=self.get_branch(), copies__gt=0)
+        if self.available_only:
+            stock = stock.filter(available__gt=0)
+        return stock.select_related('book').order_by('book__title', 'book_id')
+
+class BranchBookDetailView(BranchMixin, BookDetailView):
+    def get_copies(self):
+        return super().get_copies().filter(branch=self.get_branch())
+
+class BranchLoanedBooksListView(BranchMixin, AllLoanedBooksListView):
+    def get_queryset(self):
+        return BookInstance.objects.filter(branch=self.get_branch(), status__exact='o').order_by('due_back')
+
+@require_POST
+@permission_required('catalog.can_mark_returned')
+def transfer_copies(request):
+    """
+    Move a batch of copies to another branch.
+
+    Expects a JSON body like {"branch": <branch id>, "copies": ["<uuid>", ...]}.
+    """
+    try:
+        batch = json.loads(request.body)
+        branch_id = batch['branch']
+        scanned = batch['copies']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Expected a JSON object with "branch" and "copies".')
+    if not isinstance(scanned, list) or len(scanned) > branches.MAX_TRANSFER or not all(isinstance(value, str) for value in scanned):
+        return HttpResponseBadRequest(f'"copies" must be a list of at most {branches.MAX_TRANSFER} strings.')
+    # bool is an int too, and an id beyond MAX_ID overflows the database's integers
+    valid_id = isinstance(branch_id, int) and not isinstance(branch_id, bool) and 0 < branch_id <= MAX_ID
+    branch = Branch.objects.filter(pk=branch_id).first() if valid_id else None
+    if branch is None:
+        return HttpResponseBadRequest('"branch" must be the id of an existing branch.')
+
+    results = branches.transfer(scanned, branch)
+    summary = {}
+    for result in results:
+        summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+    return JsonResponse({'results': results, 'summary': summary})
+
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from catalog import profiling
+
+@staff_member_required
+def profile_list(request):
+    """The request profiles saved by catalog.middleware.ProfilingMiddleware."""
+    directory = getattr(settings, 'PROFILING_DIR', None)
+    context = {
+        'enabled': bool(directory),
+        'profiles': profiling.list_profiles(directory),
+    }
+    return render(request, 'catalog/profile_list.html', context)
+
+@staff_member_required
+def profile_file(request, name):
+    directory = getattr(settings, 'PROFILING_DIR', None)
+    if not directory or not profiling.PROFILE_FILE.match(name):
+        raise Http404
+    try:
+        return FileResponse(open(os.path.join(directory, name), 'rb'), as_attachment=True, filename=name)
+    except FileNotFoundError:
+        raise Http404
+
+from catalog import changelog
+
+@permission_required('catalog.can_read_changes')
+def change_feed(request):
+    """
+    Catalog changes after a cursor, oldest first.
+
+    Takes ?after=<id of the last change already processed>&limit=<batch size> and
+    returns {"changes": [...], "cursor": <next after>, "more": <another batch is ready>}.
+    """
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = int(request.GET.get('limit', 100))
+    except ValueError:
+        return HttpResponseBadRequest('"after" and "limit" must be integers.')
+    if after < 0 or not 0 < limit <= changelog.FEED_MAX_LIMIT:
+        return HttpResponseBadRequest(f'"after" must not be negative and "limit" must be between 1 and {changelog.FEED_MAX_LIMIT}.')
+
+    changes = changelog.changes_after(after, limit)
+    return JsonResponse({
+        'changes': changes,
+        'cursor': changes[-1]['id'] if changes else after,
+        'more': len(changes) == limit,
+    })
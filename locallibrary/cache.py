@@ -0,0 +1,203 @@
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+
+class _LocalTier:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.stats = defaultdict(Counter)
+
+# caches are instantiated per thread, so the in-process tier is kept here, per LOCATION
+_local_tiers = {}
+
+class TwoTierCache(BaseCache):
+    """
+    A small in-process LRU cache (L1) in front of a shared cache (L2).
+
+    OPTIONS:
+        L2: alias of the shared cache in CACHES.
+        L1_MAX_BYTES: size of the pickled values L1 may hold before evicting the least recently used.
+        L1_TIMEOUT: seconds an entry lives in L1. Writes from other processes only
+            go to L2, so this bounds how stale a worker's view can be.
+        LOCK_TIMEOUT: how long get_or_set() waits on another process computing the same key.
+
+    get_or_set() is single-flight: one thread across all processes computes a
+    missing value while the others wait for it. Hits and misses are counted per
+    namespace, the first two ':' separated parts of the key, see stats().
+    """
+    poll_interval = 0.05
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = options.get('L2', 'shared')
+        self.l1_max_bytes = options.get('L1_MAX_BYTES', 1024 * 1024)
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 30)
+        self._local = _local_tiers.setdefault(location, _LocalTier())
+        self._l1 = self._local.entries
+        self._lock = self._local.lock
+        self._flights = self._local.flights
+        self._stats = self._local.stats
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def namespace(self, key):
+        return ':'.join(str(key).split(':')[:2])
+
+    def stats(self):
+        """{namespace: {'l1_hits', 'l2_hits', 'misses', 'computed', 'waited'}} for this process."""
+        with self._lock:
+            return {namespace: dict(counts) for namespace, counts in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _count(self, key, what):
+        with self._lock:
+            self._stats[self.namespace(key)][what] += 1
+
+    def _l1_get(self, full_key):
+        with self._lock:
+            entry = self._l1.get(full_key)
+            if entry is None:
+                return MISSING
+            expires, data = entry
+            if expires < time.monotonic():
+                self._l1_pop(full_key)
+                return MISSING
+            self._l1.move_to_end(full_key)
+        return pickle.loads(data)
+
+    def _l1_set(self, full_key, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self.get_backend_timeout(timeout)
+        ttl = self.l1_timeout if timeout is None else min(self.l1_timeout, timeout - time.time())
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1_pop(full_key)
+            if ttl <= 0 or len(data) > self.l1_max_bytes:
+                return
+            self._l1[full_key] = (time.monotonic() + ttl, data)
+            self._local.size += len(data)
+            while self._local.size > self.l1_max_bytes:
+                self._l1_pop(next(iter(self._l1)))
+
+    def _l1_pop(self, full_key):
+        # callers hold self._lock
+        entry = self._l1.pop(full_key, None)
+        if entry is not None:
+            self._local.size -= len(entry[1])
+
+    def _l1_delete(self, full_key):
+        with self._lock:
+            self._l1_pop(full_key)
+
+    def _lookup(self, key, version):
+        """(value, tier) from L1 or L2, filling L1 on an L2 hit."""
+        full_key = self.make_key(key, version)
+        value = self._l1_get(full_key)
+        if value is not MISSING:
+            return value, 'l1_hits'
+        value = self.l2.get(key, MISSING, version=version)
+        if value is not MISSING:
+            self._l1_set(full_key, value)
+            return value, 'l2_hits'
+        return MISSING, 'misses'
+
+    def get(self, key, default=None, version=None):
+        value, tier = self._lookup(key, version)
+        self._count(key, tier)
+        return default if value is MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self.make_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.l2.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_key(key, version))
+        self.l2.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def has_key(self, key, version=None):
+        return self._lookup(key, version)[0] is not MISSING
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._local.size = 0
+        self.l2.clear()
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, MISSING, version=version)
+        if value is not MISSING:
+            return value
+        if not callable(default):
+            self.add(key, default, timeout, version=version)
+            return self.get(key, default, version=version)
+
+        full_key = self.make_key(key, version)
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = threading.Event()
+        if not leader:
+            # another thread in this process is computing it
+            self._count(key, 'waited')
+            flight.wait(self.lock_timeout)
+            value, tier = self._lookup(key, version)
+            if value is not MISSING:
+                return value
+        try:
+            return self._compute(key, default, timeout, version)
+        finally:
+            if leader:
+                with self._lock:
+                    del self._flights[full_key]
+                flight.set()
+
+    def _compute(self, key, default, timeout, version):
+        lock_key = f'{key}:lock'
+        locked = self.l2.add(lock_key, 1, self.lock_timeout, version=version)
+        if not locked:
+            # another process is computing it, wait for the result rather than pile on
+            self._count(key, 'waited')
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value, tier = self._lookup(key, version)
+                if value is not MISSING:
+                    return value
+        try:
+            self._count(key, 'computed')
+            value = default()
+            self.set(key, value, timeout, version=version)
+        finally:
+            if locked:
+                self.l2.delete(lock_key, version=version)
+        return value
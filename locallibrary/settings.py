@@ -48,16 +48,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
     'catalog.apps.CatalogConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalog.middleware.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'catalog.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -96,6 +99,33 @@ DATABASES = {
 }
 
 
+# Cache: a small per-process LRU in front of a cache shared by every worker.
+# The shared tier is file based here; point SHARED_CACHE_BACKEND/LOCATION at a
+# Redis or memcached backend in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'locallibrary.cache.TwoTierCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_BYTES': 4 * 1024 * 1024,
+            'L1_TIMEOUT': 5,
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    },
+}
+
+# gives tests a shared tier of their own, see locallibrary.test_runner
+TEST_RUNNER = 'locallibrary.test_runner.TestRunner'
+
+
+# permission checks read each user's permission set from the shared cache, see catalog.backends
+AUTHENTICATION_BACKENDS = ['catalog.backends.CachedModelBackend']
+# straight from the shared tier, so a revoked permission is gone for every worker at once
+PERMISSIONS_CACHE = 'shared'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -152,3 +182,20 @@ DATABASES['default'].update(db_from_env)
 # https://warehouse.python.org/project/whitenoise/
 # reduce the size of static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# where `manage.py render_static_catalog` writes the pre-rendered public catalog
+CATALOG_STATIC_EXPORT_DIR = os.environ.get('CATALOG_STATIC_EXPORT_DIR', os.path.join(BASE_DIR, 'static_catalog'))
+
+# per url name token buckets, see catalog.middleware.RateLimitMiddleware
+RATE_LIMITS = 'catalog.urls.rate_limits'
+# buckets must be seen by every worker at once, so skip the per-process tier
+RATE_LIMIT_CACHE = 'shared'
+# Heroku's router appends the client address to X-Forwarded-For
+RATE_LIMIT_FORWARDED_FOR = 'DYNO' in os.environ
+
+# Request profiling for staff, see catalog.middleware.ProfilingMiddleware. Off
+# (and the middleware not even loaded) unless PROFILING_DIR is set.
+PROFILING_DIR = os.environ.get('PROFILING_DIR')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+# url names whose arguments are secrets, recorded as '*' in profiles
+PROFILING_REDACTED_URLS = ['password_reset_confirm']
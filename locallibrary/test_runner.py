@@ -0,0 +1,21 @@
+"""
+Test runner that keeps tests away from the caches a development server uses.
+
+settings.CACHES puts the shared tier in files under BASE_DIR, so tests would
+read whatever a running server left there and clear it when they're done.
+For the length of the run the shared tier is a LocMemCache of its own.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = {**settings.CACHES, 'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared-tests'}}
+        self.test_caches = override_settings(CACHES=caches)
+        self.test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -14,14 +14,22 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.auth import views as auth_views
+from django.contrib.sitemaps.views import sitemap
 from django.urls import path, include
 from django.views.generic import RedirectView
 
+from catalog.forms import QueuedPasswordResetForm
+from catalog.sitemaps import sitemaps
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('catalog/', include('catalog.urls')),
     path('', RedirectView.as_view(url='/catalog/')),
+    # send the reset email from the task queue rather than the request
+    path('accounts/password_reset/', auth_views.PasswordResetView.as_view(form_class=QueuedPasswordResetForm), name='password_reset'),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
 ]
 
 # Use static() to add url mapping to serve static files during development only
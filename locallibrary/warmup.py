@@ -0,0 +1,136 @@
+"""
+Build the application's lazy state before it serves its first request.
+
+locallibrary.wsgi calls warmed_application() unless WSGI_WARMUP=False. With
+gunicorn's --preload that happens once in the master, and every forked worker
+starts with the URL resolver, compiled templates, static manifest and content
+type cache already in memory. Each phase's time is written to stderr.
+"""
+import os
+import sys
+import time
+
+from django.db import connections
+
+def load_urls():
+    """Import every urlconf and compile every pattern."""
+    from django.urls import URLResolver, get_resolver, reverse
+
+    def compile_patterns(patterns):
+        count = 0
+        for pattern in patterns:
+            # compiled and cached on first access
+            pattern.pattern.regex
+            count += compile_patterns(pattern.url_patterns) if isinstance(pattern, URLResolver) else 1
+        return count
+
+    resolver = get_resolver()
+    count = compile_patterns(resolver.url_patterns)
+    # builds the reverse lookup tables
+    reverse('index')
+    return f'{count} patterns'
+
+def load_templates():
+    """Compile every template, so the cached loader (on when DEBUG is off) has them all."""
+    from django.template import TemplateSyntaxError, engines
+    from django.template.backends.django import DjangoTemplates
+
+    count = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in engine.template_dirs:
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(('.html', '.txt', '.xml')):
+                        try:
+                            engine.get_template(os.path.relpath(os.path.join(root, name), directory))
+                            count += 1
+                        except TemplateSyntaxError:
+                            # some admin templates only compile in the context they're included from
+                            pass
+    return f'{count} templates'
+
+def load_static():
+    """Read the static files manifest."""
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    return f'{len(getattr(staticfiles_storage, "hashed_files", {}))} hashed files'
+
+def load_content_types():
+    """Fill the ContentType cache for every model in one query."""
+    from django.apps import apps
+    from django.contrib.contenttypes.models import ContentType
+
+    return f'{len(ContentType.objects.get_for_models(*apps.get_models()))} content types'
+
+def load_auth():
+    """Import the authentication backends and check every model's permissions exist."""
+    from django.apps import apps
+    from django.contrib.auth import get_backends
+    from django.contrib.auth.models import Permission
+
+    backends = get_backends()
+    codenames = set(Permission.objects.values_list('content_type__app_label', 'codename'))
+    missing = [
+        f'{model._meta.app_label}.{action}_{model._meta.model_name}'
+        for model in apps.get_models() for action in model._meta.default_permissions
+        if (model._meta.app_label, f'{action}_{model._meta.model_name}') not in codenames
+    ]
+    if missing:
+        # permissions are created by migrate, so this database is behind the code
+        return f'{len(backends)} backends, missing permissions {", ".join(missing)}'
+    return f'{len(backends)} backends, {len(codenames)} permissions'
+
+def check_database():
+    """Check every database answers."""
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return f'{len(connections.all())} connections'
+
+PHASES = (
+    ('urls', load_urls),
+    ('templates', load_templates),
+    ('static', load_static),
+    ('database', check_database),
+    ('contenttypes', load_content_types),
+    ('auth', load_auth),
+)
+
+def report(name, seconds, detail=''):
+    print(f'[warmup] {name:<12} {seconds * 1000:8.1f} ms  {detail}', file=sys.stderr, flush=True)
+
+def warm_up(phases=PHASES, report=report):
+    """
+    Run each phase, returning [(name, seconds, detail)].
+
+    A failing phase is reported and skipped rather than stopping the boot; the
+    work is then simply done lazily by the first request that needs it.
+    """
+    timings = []
+    try:
+        for name, phase in phases:
+            start = time.perf_counter()
+            try:
+                detail = phase()
+            except Exception as e:
+                detail = f'failed: {e!r}'
+            timings.append((name, time.perf_counter() - start, detail))
+            report(*timings[-1])
+    finally:
+        # forked workers must open their own connections, never share the master's
+        connections.close_all()
+    return timings
+
+def warmed_application():
+    """The WSGI application, set up and warmed."""
+    start = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+
+    # django.setup(), including admin autodiscovery, and loading the middleware
+    application = get_wsgi_application()
+    report('setup', time.perf_counter() - start)
+    warm_up()
+    report('total', time.perf_counter() - start)
+    return application
@@ -13,4 +13,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
-application = get_wsgi_application()
+if os.environ.get('WSGI_WARMUP', '') != 'False':
+    # see locallibrary.warmup; with gunicorn --preload this runs once, before forking
+    from locallibrary.warmup import warmed_application
+    application = warmed_application()
+else:
+    application = get_wsgi_application()